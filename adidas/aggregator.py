@@ -0,0 +1,61 @@
+import time
+from typing import Iterable, List, Union
+
+REQUIRED_PARTS = ("product_data", "api_info")
+
+
+class ProductAggregator:
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def open(self, product_stat: dict, parts: Iterable[str], state=None):
+        self.pending[product_stat["article"]] = {
+            "started_at": time.monotonic(),
+            "expected": set(parts),
+            "failed": set(),
+            "item": {"product_stat": product_stat},
+            "state": state,
+        }
+
+    def add(self, article: str, part: str, value) -> Union[dict, None]:
+        # a value of None marks the part as failed, the item is assembled without it
+        entry = self.pending.get(article)
+        if entry is None:
+            return None
+
+        entry["expected"].discard(part)
+        if value is None:
+            entry["failed"].add(part)
+        else:
+            entry["item"][part] = value
+
+        if entry["expected"]:
+            return None
+
+        return self.pending.pop(article)
+
+    def expire(self, everything: bool = False) -> List[dict]:
+        # pending keeps insertion order, so the oldest products are always first
+        deadline = time.monotonic() - self.timeout
+        entries = []
+        for entry in self.pending.values():
+            if entry["started_at"] >= deadline and not everything:
+                break
+            entries.append(entry)
+
+        for entry in entries:
+            del self.pending[entry["item"]["product_stat"]["article"]]
+            entry["failed"].update(entry["expected"])
+        return entries
+
+
+def assemble_item(entry: dict) -> Union[dict, None]:
+    item = entry["item"]
+    if any(part not in item for part in REQUIRED_PARTS):
+        return None
+
+    return {"size_chart": [], "review_data": {}, **item}
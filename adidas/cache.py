@@ -0,0 +1,38 @@
+from collections import OrderedDict
+from typing import Hashable, List, Union
+
+
+class ModelCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.values = OrderedDict()
+        self.waiters = {}
+
+    def __contains__(self, key: Hashable):
+        return key in self.values
+
+    def get(self, key: Hashable):
+        if key not in self.values:
+            return None
+
+        self.values.move_to_end(key)
+        return self.values[key]
+
+    def subscribe(self, key: Hashable, waiter) -> bool:
+        # only the first subscriber of a key has to download it, the rest wait for resolve
+        if key in self.waiters:
+            self.waiters[key].append(waiter)
+            return False
+
+        self.waiters[key] = [waiter]
+        return True
+
+    def resolve(self, key: Hashable, value: Union[dict, list, None], cache: bool = True) -> List:
+        # a value of None is handed to the waiters without being cached
+        if cache and value is not None:
+            self.values[key] = value
+            self.values.move_to_end(key)
+            while len(self.values) > self.max_entries:
+                self.values.popitem(last=False)
+
+        return self.waiters.pop(key, [])
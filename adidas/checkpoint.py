@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, Set, Union
+
+
+def item_id(item: dict) -> str:
+    # archived items are products or review batches
+    return item["review_batch"]["product_id"] if "review_batch" in item else item["product_stat"]["article"]
+
+
+def restore_lines(path: str, offset: int, keep: Callable[[bytes], bool]):
+    # the records written before the checkpoint, without the ones of articles that were not finished
+    with open(path, "rb") as reader, open(f"{path}.tmp", "wb") as writer:
+        position = 0
+        for line in reader:
+            position += len(line)
+            if position > offset or not line.endswith(b"\n"):
+                break
+            if keep(line):
+                writer.write(line)
+    os.replace(f"{path}.tmp", path)
+
+
+def restore_archive(path: str, keep: Callable[[bytes], bool]):
+    # gzip has no usable offsets, the archive is read up to the first damaged member instead
+    with gzip.open(path, "rb") as reader, gzip.open(f"{path}.tmp", "wb") as writer:
+        try:
+            for line in reader:
+                if line.endswith(b"\n") and keep(line):
+                    writer.write(line)
+        except (EOFError, OSError, zlib.error):
+            pass
+    os.replace(f"{path}.tmp", path)
+
+
+class Checkpoint:
+    def __init__(self, path: str, interval: float):
+        self.path = path
+        self.interval = interval
+        self.state = None
+        self.completed = set()
+        self.restored = frozenset()
+        # parts still missing of the articles that are being written: the product records and the last review batch
+        self.pending = {}
+        self.saved_at = time.monotonic()
+
+    @property
+    def resumed(self) -> bool:
+        return self.state is not None
+
+    def load(self) -> bool:
+        if not Path(self.path).exists():
+            return False
+
+        with open(self.path, "r", encoding="utf-8") as reader:
+            self.state = json.loads(reader.read())
+        self.restored = frozenset(self.state["completed"])
+        self.completed = set(self.restored)
+        return True
+
+    def is_restored(self, article: str) -> bool:
+        return article in self.restored
+
+    def written(self, article: str, part: str, expected: Set[str]) -> bool:
+        # true once the last part of the article is written
+        missing = self.pending.setdefault(article, set(expected))
+        missing.discard(part)
+        if missing:
+            return False
+
+        del self.pending[article]
+        self.completed.add(article)
+        return True
+
+    def product_written(self, article: str, reviews_follow: bool) -> bool:
+        return self.written(article, "product", {"product", "reviews"} if reviews_follow else {"product"})
+
+    def reviews_written(self, article: str) -> bool:
+        return self.written(article, "reviews", {"product", "reviews"})
+
+    def due(self) -> bool:
+        return self.interval > 0 and time.monotonic() - self.saved_at >= self.interval
+
+    def save(self, state: dict):
+        # written next to the old one and swapped in, a crash while saving leaves the previous checkpoint
+        state = {**state, "completed": sorted(self.completed)}
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as writer:
+            writer.write(json.dumps(state))
+            writer.flush()
+            os.fsync(writer.fileno())
+        os.replace(f"{self.path}.tmp", self.path)
+        self.saved_at = time.monotonic()
+
+    def restore(self, paths: Dict[str, str], record_id: Callable[[dict], str], archive: Union[str, None] = None):
+        def keep_record(line: bytes) -> bool:
+            return record_id(json.loads(line)) in self.completed
+
+        for prefix, path in paths.items():
+            restore_lines(path, self.state["offsets"].get(prefix, 0), keep_record)
+
+        if archive and Path(archive).exists():
+            restore_archive(archive, lambda line: item_id(json.loads(line)) in self.completed)
+
+    def clear(self):
+        Path(self.path).unlink(missing_ok=True)
@@ -0,0 +1,90 @@
+from typing import Dict, List, Union
+
+from adidas.items import CoordinatedProduct, ProductInformation, ProductMedia, ProductReview, ProductTechnology
+from adidas.utils import versioned_file
+from adidas.writers import WriterThread
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+MODELS = {
+    "product-information": ProductInformation,
+    "product-media": ProductMedia,
+    "product-coordinates": CoordinatedProduct,
+    "product-technologies": ProductTechnology,
+    "product-reviews": ProductReview,
+}
+
+
+def arrow_type(field):
+    if issubclass(field.type_, bool):
+        return pa.bool_()
+    if issubclass(field.type_, int):
+        return pa.int64()
+    if issubclass(field.type_, float):
+        return pa.float64()
+    return pa.string()
+
+
+def arrow_schema(name: str):
+    if name == "product-sizes":
+        # size charts have no model, their headers differ between products
+        return pa.schema(
+            [
+                pa.field("product_id", pa.string(), nullable=False),
+                pa.field("product_name", pa.string(), nullable=False),
+                pa.field("measurements", pa.map_(pa.string(), pa.string())),
+            ]
+        )
+
+    fields = MODELS[name].__fields__.values()
+    return pa.schema([pa.field(field.name, arrow_type(field), nullable=field.allow_none) for field in fields])
+
+
+def size_row(record: dict) -> dict:
+    measurements = [(key, str(value)) for key, value in record.items() if key not in ("product_id", "product_name")]
+    return {"product_id": record["product_id"], "product_name": record["product_name"], "measurements": measurements}
+
+
+class ParquetWriter:
+    def __init__(self, paths: Dict[str, str], row_group_size: int, queue_size: int):
+        self.paths = paths
+        self.row_group_size = row_group_size
+        self.schemas = {name: arrow_schema(name) for name in paths}
+        self.writers = {name: pq.ParquetWriter(path, self.schemas[name]) for name, path in paths.items()}
+        self.rows = {name: [] for name in paths}
+        self.thread = WriterThread(queue_size)
+        self.thread.start()
+
+    def write(self, name: str, records: List[dict]):
+        if name == "product-sizes":
+            records = [size_row(record) for record in records]
+
+        rows = self.rows[name]
+        rows.extend(records)
+        if len(rows) >= self.row_group_size:
+            self.flush_rows(name)
+
+    def flush_rows(self, name: str):
+        if not self.rows[name]:
+            return
+
+        rows = self.rows[name]
+        self.rows[name] = []
+        self.thread.submit(self.write_row_group, name, rows)
+
+    def write_row_group(self, name: str, rows: List[dict]):
+        self.writers[name].write_table(pa.Table.from_pylist(rows, schema=self.schemas[name]))
+
+    def close(self):
+        for name, writer in self.writers.items():
+            self.flush_rows(name)
+            self.thread.submit(writer.close)
+        self.thread.close()
+
+
+def load_records(name: str, date: Union[str, None] = None, version: Union[int, None] = None):
+    return pq.read_table(versioned_file("data/parquet", "parquet", date, version, prefix=name)).to_pandas()
@@ -1,22 +1,23 @@
 import json
 import smtplib
-from datetime import datetime
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
+from typing import Union
 
 from jinja2 import Environment, FileSystemLoader
 
 from adidas import settings
+from adidas.utils import versioned_file
+from adidas.versions import related_version
 
 # Set up the Jinja environment and load the template
 env = Environment(loader=FileSystemLoader("./templates"))
 
 
-def read_stats():
-    current_date = datetime.now().date().isoformat()
-    location = f"data/stats/{current_date}"
-    with open(f"{location}/latest.json", "r") as reader:
+def read_stats(date: Union[str, None] = None, version: Union[int, None] = None):
+    location = versioned_file("data/stats", "json", date, related_version("data/stats", "json", date, version))
+    with open(location, "r") as reader:
         stats = json.loads(reader.read())
 
     return {
@@ -31,15 +32,14 @@ def read_stats():
     }
 
 
-def send_email(subject: str):
-    current_date = datetime.now().date().isoformat()
+def send_email(subject: str, date: Union[str, None] = None, version: Union[int, None] = None):
     template = env.get_template("email_template.html")
 
     # Render the template with the context variables
     email_body = template.render(
         recipient_name=settings.RECIPIENT_NAME,
         sender_name="Adidas Scraper",
-        **read_stats(),
+        **read_stats(date, version),
     )
 
     # Set up the email message
@@ -52,7 +52,7 @@ def send_email(subject: str):
     msg.attach(MIMEText(email_body, "html"))
 
     # Attach a file to the email message
-    with open(f"data/spreadsheets/{current_date}/latest.xlsx", "rb") as reader:
+    with open(versioned_file("data/spreadsheets", "xlsx", date), "rb") as reader:
         file_data = reader.read()
     attachment = MIMEApplication(file_data, _subtype="xlsx")
     attachment.add_header("Content-Disposition", "attachment", filename="report.xlsx")
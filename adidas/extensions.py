@@ -0,0 +1,214 @@
+import os
+import time
+from typing import List
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import reactor, task
+from twisted.web.resource import Resource
+from twisted.web.server import Site
+
+from adidas.telemetry import LatencyHistogram, bucket_upper_bound, latency_prefixes
+
+
+def read_rss() -> int:
+    # resident set size in bytes, only available where /proc is
+    try:
+        with open("/proc/self/statm", "r") as reader:
+            return int(reader.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def metric_line(name: str, value, **labels) -> str:
+    if not labels:
+        return f"{name} {value}"
+    label_text = ",".join(f'{key}="{label}"' for key, label in labels.items())
+    return f"{name}{{{label_text}}} {value}"
+
+
+class MetricsResource(Resource):
+    isLeaf = True
+
+    def __init__(self, extension):
+        super().__init__()
+        self.extension = extension
+
+    def render_GET(self, request):
+        request.setHeader(b"Content-Type", b"text/plain; version=0.0.4; charset=utf-8")
+        return "\n".join(self.extension.collect()).encode("utf-8") + b"\n"
+
+
+class MetricsExtension:
+    def __init__(self, crawler, port: int, interval: float):
+        self.crawler = crawler
+        self.port = port
+        self.interval = interval
+        self.listener = None
+        self.sampler = None
+        self.last_sample = None
+        self.rates = {"items": 0.0, "bytes": 0.0}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("METRICS_ENABLED"):
+            raise NotConfigured
+
+        extension = cls(crawler, crawler.settings.getint("METRICS_PORT"), crawler.settings.getfloat("METRICS_INTERVAL"))
+        crawler.signals.connect(extension.engine_started, signal=signals.engine_started)
+        crawler.signals.connect(extension.engine_stopped, signal=signals.engine_stopped)
+        return extension
+
+    def engine_started(self):
+        self.listener = reactor.listenTCP(self.port, Site(MetricsResource(self)), interface="127.0.0.1")
+        self.sampler = task.LoopingCall(self.sample)
+        self.sampler.start(self.interval)
+
+    def engine_stopped(self):
+        if self.sampler and self.sampler.running:
+            self.sampler.stop()
+        if self.listener:
+            return self.listener.stopListening()
+
+    def sample(self):
+        # items/s and bytes/s over the last interval, so every scrape of the endpoint sees the same rates
+        stats = self.crawler.stats
+        current = (
+            time.monotonic(),
+            stats.get_value("item_scraped_count", 0),
+            stats.get_value("downloader/response_bytes", 0),
+        )
+        if self.last_sample:
+            elapsed = current[0] - self.last_sample[0]
+            self.rates["items"] = (current[1] - self.last_sample[1]) / elapsed
+            self.rates["bytes"] = (current[2] - self.last_sample[2]) / elapsed
+        self.last_sample = current
+
+    def collect(self) -> List[str]:
+        stats = self.crawler.stats.get_stats()
+        engine = self.crawler.engine
+        lines = [
+            "# TYPE adidas_items_scraped_total counter",
+            metric_line("adidas_items_scraped_total", stats.get("item_scraped_count", 0)),
+            "# TYPE adidas_items_per_second gauge",
+            metric_line("adidas_items_per_second", round(self.rates["items"], 3)),
+            "# TYPE adidas_response_bytes_total counter",
+            metric_line("adidas_response_bytes_total", stats.get("downloader/response_bytes", 0)),
+            "# TYPE adidas_response_bytes_per_second gauge",
+            metric_line("adidas_response_bytes_per_second", round(self.rates["bytes"], 3)),
+            "# TYPE adidas_memory_rss_bytes gauge",
+            metric_line("adidas_memory_rss_bytes", read_rss()),
+        ]
+
+        if engine and engine.slot:
+            pipeline_queue_depth = engine.scraper.slot.itemproc_size if engine.scraper.slot else 0
+            lines.extend(
+                [
+                    "# TYPE adidas_scheduler_queue_size gauge",
+                    metric_line("adidas_scheduler_queue_size", len(engine.slot.scheduler)),
+                    "# TYPE adidas_pipeline_queue_depth gauge",
+                    metric_line("adidas_pipeline_queue_depth", pipeline_queue_depth),
+                ]
+            )
+
+        if engine:
+            lines.append("# TYPE adidas_requests_in_flight gauge")
+            for host, slot in engine.downloader.slots.items():
+                lines.append(metric_line("adidas_requests_in_flight", len(slot.transferring), host=host))
+            lines.append("# TYPE adidas_requests_queued gauge")
+            for host, slot in engine.downloader.slots.items():
+                lines.append(metric_line("adidas_requests_queued", len(slot.queue), host=host))
+
+        lines.append("# TYPE adidas_latency_seconds histogram")
+        for prefix in latency_prefixes(stats):
+            _, stage, endpoint = prefix.split("/")
+            labels = {"stage": stage, "endpoint": endpoint}
+            histogram = LatencyHistogram.from_stats(stats, prefix)
+            cumulative = 0
+            for bucket in sorted(histogram.counts):
+                cumulative += histogram.counts[bucket]
+                le = f"{bucket_upper_bound(bucket):.6f}"
+                lines.append(metric_line("adidas_latency_seconds_bucket", cumulative, **labels, le=le))
+            lines.append(metric_line("adidas_latency_seconds_bucket", cumulative, **labels, le="+Inf"))
+            lines.append(metric_line("adidas_latency_seconds_sum", round(stats.get(f"{prefix}/sum", 0.0), 6), **labels))
+            lines.append(metric_line("adidas_latency_seconds_count", cumulative, **labels))
+
+        return lines
+
+
+class AdaptiveConcurrency:
+    # AIMD per download slot: add one request after a healthy window, halve on errors, 429s or slow responses
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.targets = settings.getdict("ADAPTIVE_CONCURRENCY_TARGETS")
+        self.default_target = settings.getfloat("ADAPTIVE_CONCURRENCY_TARGET_LATENCY")
+        self.window = settings.getint("ADAPTIVE_CONCURRENCY_WINDOW")
+        self.max_error_rate = settings.getfloat("ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE")
+        self.min_concurrency = settings.getint("ADAPTIVE_CONCURRENCY_MIN")
+        self.max_concurrency = settings.getint("ADAPTIVE_CONCURRENCY_MAX")
+        self.samples = {}
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("ADAPTIVE_CONCURRENCY_ENABLED"):
+            raise NotConfigured
+
+        extension = cls(crawler)
+        crawler.signals.connect(extension.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(extension.request_left_downloader, signal=signals.request_left_downloader)
+        return extension
+
+    def response_downloaded(self, response, request, spider):
+        # fired before request_left_downloader, requests left without this mark failed to download
+        request.meta["adaptive_concurrency_status"] = response.status
+
+    def request_left_downloader(self, request, spider):
+        key = request.meta.get("download_slot")
+        if key is None:
+            return
+
+        status = request.meta.pop("adaptive_concurrency_status", None)
+        failed = status is None or status == 429 or status >= 500
+        # download_latency leaves out the time spent waiting in the slot queue, which grows when concurrency drops
+        latency = request.meta.get("download_latency", 0.0)
+        samples = self.samples.setdefault(key, [])
+        samples.append((latency, failed, status == 429))
+
+        if len(samples) >= self.window:
+            self.samples[key] = []
+            self.adjust(key, samples)
+
+    def target_latency(self, key: str) -> float:
+        for host, target in self.targets.items():
+            if key == host or key.endswith(f".{host}"):
+                return float(target)
+        return self.default_target
+
+    def adjust(self, key: str, samples: list):
+        slot = self.crawler.engine.downloader.slots.get(key)
+        if slot is None:
+            return
+
+        latencies = sorted(latency for latency, _, _ in samples)
+        p90 = latencies[int(0.9 * (len(latencies) - 1))]
+        error_rate = sum(1 for _, failed, _ in samples if failed) / len(samples)
+        throttled = any(limited for _, _, limited in samples)
+
+        stats = self.crawler.stats
+        if throttled or error_rate > self.max_error_rate or p90 > self.target_latency(key):
+            concurrency = max(self.min_concurrency, slot.concurrency // 2)
+            stats.inc_value(f"adaptive_concurrency/{key}/decrease")
+        else:
+            concurrency = min(self.max_concurrency, slot.concurrency + 1)
+            stats.inc_value(f"adaptive_concurrency/{key}/increase")
+
+        if concurrency != slot.concurrency:
+            self.crawler.spider.logger.debug(
+                f"Concurrency of {key} set to {concurrency} (p90 {p90:.3f}s, error rate {error_rate:.2%})"
+            )
+        slot.concurrency = concurrency
+        stats.set_value(f"adaptive_concurrency/{key}/concurrency", concurrency)
+        stats.max_value(f"adaptive_concurrency/{key}/max_concurrency", concurrency)
+        stats.min_value(f"adaptive_concurrency/{key}/min_concurrency", concurrency)
+        stats.set_value(f"adaptive_concurrency/{key}/p90_latency", round(p90, 4))
@@ -0,0 +1,101 @@
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+from scrapy.http import HtmlResponse
+from w3lib.html import remove_tags
+
+PRODUCT_PAGE_SELECTORS = {
+    "name": "div.articleNameHeader.css-t1z1wj > h1::text",
+    "category": "div.articleNameHeader.css-t1z1wj > a > span::text",
+    "breadcrumb": "div.breadcrumb_wrap > ul > li.breadcrumbListItem:not(.back) > a::text",
+    "available_sizes": "div.test-sizeSelector > ul button::text",
+    "sense_of_fit": "span.test-marker",
+    "title_of_description": "h4.itemFeature::text",
+    "itemization_description": "li.articleFeaturesItem",
+}
+
+
+def product_page_data(fields: Dict[str, List[str]]) -> dict:
+    # every backend returns all matches per field, the page data is shaped the same way for all of them
+    return {
+        "name": next(iter(fields["name"]), None),
+        "category": "".join(fields["category"]),
+        "breadcrumb": "/".join(fields["breadcrumb"]),
+        "available_sizes": fields["available_sizes"],
+        "sense_of_fit": "適切" if fields["sense_of_fit"] else None,
+        "title_of_description": next(iter(fields["title_of_description"]), None),
+        "itemization_description": [remove_tags(item) for item in fields["itemization_description"]],
+    }
+
+
+def extract_with_css(response) -> dict:
+    return product_page_data({field: response.css(css).getall() for field, css in PRODUCT_PAGE_SELECTORS.items()})
+
+
+def compile_selector(css: str) -> etree.XPath:
+    # translated the way parsel does it for html documents, then compiled by lxml once
+    return etree.XPath(HTMLTranslator().css_to_xpath(css), smart_strings=False)
+
+
+COMPILED_SELECTORS = {field: compile_selector(css) for field, css in PRODUCT_PAGE_SELECTORS.items()}
+
+
+def serialize(node) -> str:
+    if isinstance(node, str):
+        return node
+    return etree.tostring(node, method="html", encoding="unicode", with_tail=False)
+
+
+def extract_with_xpath(response) -> dict:
+    root = response.selector.root
+    return product_page_data(
+        {field: [serialize(node) for node in xpath(root)] for field, xpath in COMPILED_SELECTORS.items()}
+    )
+
+
+PRODUCT_PAGE_EXTRACTORS = {
+    "css": extract_with_css,
+    "xpath": extract_with_xpath,
+}
+
+
+def load_pages(location: str) -> List[HtmlResponse]:
+    pages = []
+    for path in sorted(Path(location).glob("*.html")):
+        url = f"https://shop.adidas.jp/products/{path.stem}/"
+        pages.append(HtmlResponse(url=url, body=path.read_bytes(), encoding="utf-8"))
+    return pages
+
+
+def benchmark_extractor(extractor: Callable, pages: List[HtmlResponse], rounds: int) -> Dict[str, float]:
+    # fresh responses every round, so parsing the document is part of the measurement
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            extractor(page.replace())
+    pages_per_second = len(pages) * rounds / (time.perf_counter() - started_at)
+
+    # the same responses again, their documents are parsed already and only the extraction is measured
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            extractor(page)
+    extractions_per_second = len(pages) * rounds / (time.perf_counter() - started_at)
+
+    return {"pages_per_second": pages_per_second, "extractions_per_second": extractions_per_second}
+
+
+def benchmark_extractors(location: str, rounds: int = 5) -> Dict[str, Dict[str, float]]:
+    pages = load_pages(location)
+    if not pages:
+        raise FileNotFoundError(f"No saved product pages (*.html) in {location}")
+
+    for page in pages:
+        results = {name: extractor(page) for name, extractor in PRODUCT_PAGE_EXTRACTORS.items()}
+        if len({repr(result) for result in results.values()}) != 1:
+            raise ValueError(f"Extractors disagree on {page.url}: {results}")
+
+    return {name: benchmark_extractor(extractor, pages, rounds) for name, extractor in PRODUCT_PAGE_EXTRACTORS.items()}
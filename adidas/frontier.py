@@ -0,0 +1,39 @@
+import sqlite3
+import zlib
+from typing import Iterable, Set
+
+
+def shard_of(article: str, shards: int) -> int:
+    # stable across processes and runs, unlike hash()
+    return zlib.crc32(article.encode("utf-8")) % shards
+
+
+class Frontier:
+    # articles claimed by the crawler processes of one sharded run, the first shard to claim an article crawls it
+    def __init__(self, path: str, shard: int):
+        self.shard = shard
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("CREATE TABLE IF NOT EXISTS claims (article TEXT PRIMARY KEY, shard INTEGER)")
+        self.connection.commit()
+
+    def claim(self, articles: Iterable[str]) -> Set[str]:
+        # one transaction per catalogue page, returns the articles this shard owns
+        articles = list(articles)
+        if not articles:
+            return set()
+
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR IGNORE INTO claims VALUES (?, ?)",
+                [(article, self.shard) for article in articles],
+            )
+            placeholders = ",".join("?" * len(articles))
+            rows = self.connection.execute(
+                f"SELECT article FROM claims WHERE shard = ? AND article IN ({placeholders})",
+                [self.shard, *articles],
+            ).fetchall()
+        return {article for (article,) in rows}
+
+    def close(self):
+        self.connection.close()
@@ -0,0 +1,174 @@
+import gzip
+import logging
+import sqlite3
+from pathlib import Path
+from time import time
+
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+
+from adidas.telemetry import Endpoint, classify_endpoint
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# bodies smaller than this are stored as they are, compressing them saves next to nothing
+MIN_COMPRESSED_SIZE = 256
+
+
+class Codec:
+    def __init__(self, name: str):
+        if name == "zstd" and zstandard is None:
+            logger.warning("HTTPCACHE_COMPRESSION is zstd but zstandard is not installed, using gzip")
+            name = "gzip"
+
+        if name not in ("zstd", "gzip", "identity"):
+            raise ValueError(f"Unknown cache compression: {name}")
+
+        self.name = name
+        self.compressor = zstandard.ZstdCompressor(level=3) if name == "zstd" else None
+        self.decompressor = zstandard.ZstdDecompressor() if zstandard else None
+
+    def compress(self, body: bytes) -> tuple:
+        if len(body) < MIN_COMPRESSED_SIZE or self.name == "identity":
+            return "identity", body
+        if self.name == "zstd":
+            return "zstd", self.compressor.compress(body)
+        return "gzip", gzip.compress(body, compresslevel=6, mtime=0)
+
+    def decompress(self, codec: str, body: bytes) -> bytes:
+        # every row names its own codec, a cache written with another setting stays readable
+        if codec == "zstd":
+            if self.decompressor is None:
+                raise RuntimeError("The cache holds zstd compressed responses but zstandard is not installed")
+            return self.decompressor.decompress(body)
+        if codec == "gzip":
+            return gzip.decompress(body)
+        return body
+
+
+class SQLiteCacheStorage:
+    # one file per spider instead of a directory per request, bodies compressed, least recently used evicted first
+    def __init__(self, settings):
+        self.cachedir = data_path(settings["HTTPCACHE_DIR"], createdir=True)
+        self.expiration_secs = settings.getint("HTTPCACHE_EXPIRATION_SECS")
+        self.endpoint_expiration_secs = {
+            Endpoint[name.upper()]: int(seconds)
+            for name, seconds in settings.getdict("HTTPCACHE_ENDPOINT_EXPIRATION_SECS").items()
+        }
+        self.max_size = settings.getint("HTTPCACHE_MAX_SIZE")
+        self.commit_every = settings.getint("HTTPCACHE_COMMIT_EVERY", 100)
+        self.codec = Codec(settings.get("HTTPCACHE_COMPRESSION", "zstd"))
+        self.connection = None
+        self.size = 0
+        self.uncommitted = 0
+
+    def open_spider(self, spider):
+        path = Path(self.cachedir, f"{spider.name}.sqlite")
+        self.connection = sqlite3.connect(str(path))
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "fingerprint BLOB PRIMARY KEY, endpoint INTEGER, stored_at REAL, accessed_at REAL, size INTEGER, "
+            "status INTEGER, url TEXT, headers BLOB, codec TEXT, body BLOB)"
+        )
+        self.connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+        logger.debug("Using SQLite cache storage in %(cachepath)s", {"cachepath": path}, extra={"spider": spider})
+        self._fingerprinter = spider.crawler.request_fingerprinter
+        self.stats = spider.crawler.stats
+
+    def close_spider(self, spider):
+        self.connection.commit()
+        self.connection.close()
+        self.stats.set_value("httpcache/size", self.size)
+
+    def expiration(self, endpoint: Endpoint) -> int:
+        return self.endpoint_expiration_secs.get(endpoint, self.expiration_secs)
+
+    def retrieve_response(self, spider, request):
+        fingerprint = self._fingerprinter.fingerprint(request)
+        row = self.connection.execute(
+            "SELECT endpoint, stored_at, status, url, headers, codec, body FROM responses WHERE fingerprint = ?",
+            (fingerprint,),
+        ).fetchone()
+        if row is None:
+            return None  # not cached
+
+        endpoint, stored_at, status, url, raw_headers, codec, body = row
+        if 0 < self.expiration(Endpoint(endpoint)) < time() - stored_at:
+            self.stats.inc_value("httpcache/expired")
+            return None  # expired, replaced once the fresh response is stored
+
+        self.connection.execute("UPDATE responses SET accessed_at = ? WHERE fingerprint = ?", (time(), fingerprint))
+        self.written()
+
+        headers = Headers(headers_raw_to_dict(raw_headers))
+        body = self.codec.decompress(codec, body)
+        respcls = responsetypes.from_args(headers=headers, url=url, body=body)
+        return respcls(url=url, headers=headers, status=status, body=body)
+
+    def store_response(self, spider, request, response):
+        fingerprint = self._fingerprinter.fingerprint(request)
+        raw_headers = headers_dict_to_raw(response.headers)
+        codec, body = self.codec.compress(response.body)
+        size = len(body) + len(raw_headers)
+
+        previous = self.connection.execute(
+            "SELECT size FROM responses WHERE fingerprint = ?",
+            (fingerprint,),
+        ).fetchone()
+        if previous:
+            self.size -= previous[0]
+
+        now = time()
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                fingerprint,
+                classify_endpoint(request.url),
+                now,
+                now,
+                size,
+                response.status,
+                response.url,
+                raw_headers,
+                codec,
+                body,
+            ),
+        )
+        self.size += size
+        self.stats.inc_value("httpcache/stored_bytes", size)
+        self.stats.inc_value("httpcache/body_bytes", len(response.body))
+
+        if self.max_size and self.size > self.max_size:
+            self.evict()
+        self.written()
+
+    def evict(self):
+        # down to 90% of the bound, so a full cache does not evict on every store
+        target = int(self.max_size * 0.9)
+        evicted = []
+        rows = self.connection.execute("SELECT fingerprint, size FROM responses ORDER BY accessed_at")
+        for fingerprint, size in rows:
+            if self.size <= target:
+                break
+            evicted.append((fingerprint,))
+            self.size -= size
+
+        self.connection.executemany("DELETE FROM responses WHERE fingerprint = ?", evicted)
+        self.stats.inc_value("httpcache/evicted", len(evicted))
+
+    def written(self):
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.connection.commit()
+            self.uncommitted = 0
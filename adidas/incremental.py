@@ -0,0 +1,102 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Tuple, Union
+
+from adidas.versions import read_manifest, resolve_version
+
+
+def fingerprint(product_stat: dict, ignored_fields: Iterable[str] = ()) -> str:
+    # the catalogue entry carries price, review_count and the modification hints of an article
+    entry = {key: value for key, value in product_stat.items() if key not in ignored_fields}
+    return hashlib.sha1(json.dumps(entry, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def record_product_id(record: dict) -> str:
+    return record["product_id"] if "product_id" in record else record["main_product_id"]
+
+
+class IncrementalStore:
+    def __init__(self, path: str, ignored_fields: Iterable[str] = ()):
+        self.path = path
+        self.ignored_fields = set(ignored_fields)
+        self.previous = {}
+        self.previous_watermarks = {}
+        self.source = None
+        self.fingerprints = {}
+        self.watermarks = {}
+        self.carried = set()
+        self.carried_reviews = set()
+
+    def load(self, root: str, ext: str, prefixes: List[str]):
+        # has to run before create_directory takes a new version, the sizes are those of the -latest files
+        if not Path(self.path).exists():
+            return
+
+        with open(self.path, "r", encoding="utf-8") as reader:
+            state = json.loads(reader.read())
+
+        location = state["location"]
+        for prefix in prefixes:
+            source = Path(f"{location}/{prefix}-latest.{ext}")
+            if not source.exists() or source.stat().st_size != state["sizes"].get(prefix):
+                # another run wrote over the files these fingerprints describe
+                return
+
+        # the files are looked up by version when they are copied, by then they may have been renamed
+        self.source = (root, ext, Path(location).name, read_manifest(location, ext)["latest"])
+        self.previous = state["fingerprints"]
+        self.previous_watermarks = state.get("watermarks", {})
+
+    def fingerprint(self, product_stat: dict) -> str:
+        return fingerprint(product_stat, self.ignored_fields)
+
+    def is_unchanged(self, product_stat: dict) -> bool:
+        return self.previous.get(product_stat["article"]) == self.fingerprint(product_stat)
+
+    def watermark(self, product_stat: dict) -> Union[dict, None]:
+        # latest review stored for the article, only usable while its previous records can be copied
+        return self.previous_watermarks.get(product_stat["article"]) if self.source else None
+
+    def carry(self, product_stat: dict):
+        article = product_stat["article"]
+        self.carried.add(article)
+        self.fingerprints[article] = self.previous[article]
+        if article in self.previous_watermarks:
+            self.watermarks[article] = self.previous_watermarks[article]
+
+    def carry_reviews(self, product_stat: dict):
+        self.carried_reviews.add(product_stat["article"])
+
+    def record(self, product_stat: dict, watermark: Union[dict, None] = None):
+        article = product_stat["article"]
+        self.fingerprints[article] = self.fingerprint(product_stat)
+        if watermark:
+            self.watermarks[article] = {**watermark, "review_count": product_stat["review_count"]}
+
+    def copy_forward(self, prefix: str) -> Iterable[Tuple[bytes, dict]]:
+        # lines of the previous run belonging to the carried articles, copied as they are
+        articles = self.carried | self.carried_reviews if prefix == "product-reviews" else self.carried
+        if not articles or not self.source:
+            return
+
+        root, ext, date, version = self.source
+        with open(resolve_version(root, ext, date, version, prefix), "rb") as reader:
+            for line in reader:
+                record = json.loads(line)
+                if record_product_id(record) in articles:
+                    yield line, record
+
+    def save(self, location: str, files: Dict[str, str]):
+        state = {
+            "location": location,
+            "sizes": {prefix: Path(filename).stat().st_size for prefix, filename in files.items()},
+            "fingerprints": self.fingerprints,
+            "watermarks": self.watermarks,
+        }
+
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        with open(f"{self.path}.tmp", "w", encoding="utf-8") as writer:
+            writer.write(json.dumps(state))
+        os.replace(f"{self.path}.tmp", self.path)
@@ -1,7 +1,32 @@
 from datetime import datetime
-from typing import Union
+from functools import lru_cache
+from typing import Dict, List, Type, Union
 
-from pydantic import BaseModel, HttpUrl, validator
+from pydantic import BaseModel, HttpUrl, ValidationError, validator
+from pydantic.error_wrappers import ErrorWrapper
+from pydantic.errors import MissingError
+from pydantic.fields import ModelField
+
+
+@lru_cache(maxsize=4096)
+def parse_price(v: str) -> float:
+    return float(v.replace(",", ""))
+
+
+@lru_cache(maxsize=1024)
+def parse_percentage(v: str) -> float:
+    return float(v.replace("%", "")) / 100
+
+
+@lru_cache(maxsize=1024)
+def parse_rate(v: str) -> float:
+    return float(v.split("/")[0])
+
+
+@lru_cache(maxsize=4096)
+def parse_review_date(v: str) -> str:
+    date_format = "%Y年%m月%d日"
+    return datetime.strptime(v, date_format).date().isoformat()
 
 
 class ProductCore(BaseModel):
@@ -32,7 +57,7 @@ class ProductInformation(ProductCore):
 
     @validator("price", pre=True)
     def extract_price(cls, v):
-        return float(v.replace(",", ""))
+        return parse_price(v)
 
     @validator("available_sizes", pre=True)
     def stringify_available_sizes(cls, v):
@@ -49,13 +74,13 @@ class ProductInformation(ProductCore):
     @validator("recommended_rate", pre=True)
     def extract_recommended_rate(cls, v):
         if v:
-            return float(v.replace("%", "")) / 100
+            return parse_percentage(v)
         return None
 
     @validator("sense_of_fit_rate", "appropriation_of_length_rate", "material_quality_rate", "comfort_rate", pre=True)
     def extract_rates(cls, v):
         if v:
-            return float(v.split("/")[0])
+            return parse_rate(v)
         return None
 
 
@@ -77,7 +102,7 @@ class CoordinatedProduct(ProductCore):
 
     @validator("coordinated_product_price", pre=True)
     def extract_coordinated_product_price(cls, v):
-        return float(v.replace(",", ""))
+        return parse_price(v)
 
     @validator("coordinated_product_page_url", pre=True)
     def extract_coordinated_product_page_url(cls, v):
@@ -115,5 +140,47 @@ class ProductReview(ProductCore):
 
     @validator("review_date", pre=True)
     def extract_review_date(cls, v):
-        date_format = "%Y年%m月%d日"
-        return datetime.strptime(v, date_format).date().isoformat()
+        return parse_review_date(v)
+
+
+def validate_field(model: Type[BaseModel], field: ModelField, value, values: dict, cache: dict):
+    try:
+        key = (type(value), value)
+        result = cache.get(key)
+    except TypeError:
+        # lists and dicts can not be cached, they are validated every time
+        key = result = None
+
+    if result is None:
+        result = field.validate(value, values, loc=field.alias, cls=model)
+        if key is not None:
+            cache[key] = result
+    return result
+
+
+def validate_records(model: Type[BaseModel], records: List[dict]) -> List[Dict]:
+    # same validation as model(**record).dict(), but each distinct value of a field is validated
+    # once per batch and no model instances are built
+    results = {name: {} for name in model.__fields__}
+    validated = []
+    for record in records:
+        values, errors = {}, []
+        for name, field in model.__fields__.items():
+            if field.alias not in record:
+                if field.required:
+                    errors.append(ErrorWrapper(MissingError(), loc=field.alias))
+                    continue
+                values[name] = field.get_default()
+                continue
+
+            value, error = validate_field(model, field, record[field.alias], values, results[name])
+            if error:
+                errors.append(error)
+            else:
+                values[name] = value
+
+        if errors:
+            raise ValidationError(errors, model)
+        validated.append(values)
+
+    return validated
@@ -0,0 +1,69 @@
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from typing import Callable, Dict, Union
+
+from adidas import settings
+from adidas.email import send_email
+from adidas.reporter import create_dashboard
+from adidas.transformers import generate_product_spreadsheet
+from adidas.utils import create_directory
+from adidas.versions import seal_version
+
+
+def timed(func: Callable, *args) -> float:
+    started_at = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - started_at
+
+
+def build_spreadsheet(date: Union[str, None], version: Union[int, None]):
+    generate_product_spreadsheet(settings.SPREADSHEET_STREAMING, date, version)
+
+
+def build_dashboard(date: Union[str, None], version: Union[int, None]):
+    create_dashboard(save=True, show=False, date=date, version=version)
+
+
+def mail_report(date: Union[str, None], version: Union[int, None]):
+    send_email("Completion of Scraper Task", date, version)
+
+
+def run_report_jobs(
+    date: Union[str, None] = None,
+    version: Union[int, None] = None,
+    dashboard: bool = False,
+    email: bool = False,
+) -> Dict[str, dict]:
+    # spreadsheet and dashboard are independent, the email waits for the spreadsheet it attaches
+    jobs = {"spreadsheet": build_spreadsheet}
+    if dashboard:
+        jobs["dashboard"] = build_dashboard
+
+    report = {}
+    started_at = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=settings.REPORT_WORKERS, mp_context=get_context("spawn")) as executor:
+        pending = {executor.submit(timed, job, date, version): name for name, job in jobs.items()}
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = pending.pop(future)
+                try:
+                    report[name] = {"status": "finished", "seconds": round(future.result(), 3)}
+                except Exception as error:
+                    report[name] = {"status": "failed", "error": repr(error)}
+
+                if name == "spreadsheet" and email:
+                    if report[name]["status"] == "finished":
+                        pending[executor.submit(timed, mail_report, date, version)] = "email"
+                    else:
+                        report["email"] = {"status": "skipped"}
+
+    report["total"] = {"status": "finished", "seconds": round(time.perf_counter() - started_at, 3)}
+
+    location = create_directory("data/jobs", "json", date=date)
+    with open(f"{location}/latest.json", "w") as writer:
+        writer.write(json.dumps({"date": date, "version": version, "jobs": report}, indent=2))
+    seal_version(location)
+    return report
@@ -1,42 +1,30 @@
-import json
-import sys
-from datetime import datetime
-from pathlib import Path
+import os
+import time
 
 from scrapy import signals
 
+from adidas.telemetry import TelemetrySink, classify_endpoint, record_latency
+from adidas.versions import allocate_version, resolve_version, run_version, seal_version
+
 
 class AdidasSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the spider middleware does not modify the
     # passed objects.
 
+    def __init__(self, stats):
+        self.stats = stats
+
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        s = cls(crawler.stats)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
         return s
 
     def process_spider_input(self, response, spider):
         # Called for each response that goes through the spider
         # middleware and into the spider.
-        scraping_date = datetime.now().date().isoformat()
-        location = f"data/dashboard/{scraping_date}"
-
-        if response.status == 200:
-            with open(f"{location}/latest.jl", "a", encoding="utf-8") as writer:
-                writer.write(
-                    json.dumps(
-                        {
-                            "url": response.url,
-                            "sent_at": response.headers["request_sent"].decode("utf-8"),
-                            "received_at": response.headers["response_received"].decode("utf-8"),
-                            "response_size": sys.getsizeof(response.body),
-                        }
-                    )
-                )
-                writer.write("\n")
 
         # Should return None or raise an exception.
         return None
@@ -46,9 +34,21 @@ class AdidasSpiderMiddleware:
         # it has processed the response.
 
         # Must return an iterable of Request, or item objects.
-        for i in result:
+        # only the time spent inside the callback counts, not the time its output spends downstream
+        elapsed = 0.0
+        iterator = iter(result)
+        while True:
+            started_at = time.monotonic()
+            try:
+                i = next(iterator)
+            except StopIteration:
+                break
+            finally:
+                elapsed += time.monotonic() - started_at
             yield i
 
+        record_latency(self.stats, "parse", classify_endpoint(response.url), elapsed)
+
     def process_spider_exception(self, response, exception, spider):
         # Called when a spider or process_spider_input() method
         # (from other spider middleware) raises an exception.
@@ -68,34 +68,30 @@ class AdidasSpiderMiddleware:
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
 
-        scraping_date = datetime.now().date().isoformat()
-        location = f"data/dashboard/{scraping_date}"
-        Path(location).mkdir(parents=True, exist_ok=True)
-
-        version = len([file for file in Path(location).glob("*") if file.is_file()])
-
-        if version:
-            current_latest_version = Path(f"{location}/latest.jl")
-            renamed_file = Path(f"{location}/version-{version}.jl")
-            current_latest_version.rename(renamed_file)
-
 
 class AdidasDownloaderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
     # scrapy acts as if the downloader middleware does not modify the
     # passed objects.
 
+    def __init__(self, settings, stats):
+        self.settings = settings
+        self.stats = stats
+        self.telemetry = None
+
     @classmethod
     def from_crawler(cls, crawler):
         # This method is used by Scrapy to create your spiders.
-        s = cls()
+        s = cls(crawler.settings, crawler.stats)
         crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(s.spider_closed, signal=signals.spider_closed)
+        # fired for every downloaded response, including the ones retried before reaching process_response
+        crawler.signals.connect(s.response_downloaded, signal=signals.response_downloaded)
         return s
 
     def process_request(self, request, spider):
         # Called for each request that goes through the downloader
         # middleware.
-        request.headers["request_sent"] = datetime.now().isoformat()
 
         # Must either:
         # - return None: continue processing this request
@@ -107,8 +103,6 @@ class AdidasDownloaderMiddleware:
 
     def process_response(self, request, response, spider):
         # Called with the response returned from the downloader.
-        response.headers["request_sent"] = request.headers["request_sent"]
-        response.headers["response_received"] = datetime.now().isoformat()
 
         # Must either;
         # - return a Response object
@@ -126,5 +120,43 @@ class AdidasDownloaderMiddleware:
         # - return a Request object: stops process_exception() chain
         pass
 
+    def response_downloaded(self, response, request, spider):
+        # set by the download handler once the request leaves the slot queue, so neither the wait in the queue nor
+        # DOWNLOAD_DELAY is counted. Responses that did not come over http (data: urls) have none
+        if "download_latency" not in request.meta:
+            return
+
+        endpoint = classify_endpoint(request.url)
+        latency = request.meta["download_latency"]
+        record_latency(self.stats, "download", endpoint, latency)
+
+        if self.telemetry:
+            received_at = time.time()
+            self.telemetry.record(received_at - latency, received_at, len(response.body), response.status, endpoint)
+
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+        version = None
+        if spider.checkpoint.resumed:
+            # a resumed crawl adds to the telemetry of the run it continues, found by its run id
+            date = spider.checkpoint.state["date"]
+            version = run_version("data/dashboard", "bin", date, spider.checkpoint.state["run_id"])
+
+        if version:
+            path = resolve_version("data/dashboard", "bin", date, version)
+        else:
+            location, version = allocate_version("data/dashboard", "bin")
+            path = f"{location}/latest.bin"
+        self.telemetry_location, self.telemetry_version = os.path.dirname(path), version
+        self.telemetry = TelemetrySink(
+            path,
+            capacity=self.settings.getint("TELEMETRY_BUFFER_SIZE"),
+            flush_interval=self.settings.getfloat("TELEMETRY_FLUSH_INTERVAL"),
+        )
+
+    def spider_closed(self, spider, reason):
+        if self.telemetry:
+            self.telemetry.close()
+            if reason == "finished":
+                seal_version(self.telemetry_location, self.telemetry_version)
@@ -1,101 +1,208 @@
-import json
+import os
 
 from itemadapter import ItemAdapter
 from scrapy import signals
 
-from adidas.preprocessors import (
-    process_product_coordinates,
-    process_product_information,
-    process_product_media,
-    process_product_reviews,
-    process_product_sizes,
-    process_product_technologies,
-)
-from adidas.transformers import generate_product_spreadsheet
+from adidas import columnar, versions
+from adidas.incremental import record_product_id
+from adidas.preprocessors import process_product, process_review_batch
+from adidas.state import ReviewBatch
 from adidas.utils import create_directory
+from adidas.versions import allocate_version, resolve_version, seal_version
+from adidas.writers import JsonLinesWriter
+
+RAW_ARCHIVE_PREFIX = "raw-items"
 
 
 class AdidasPipeline:
+    prefixes = [
+        "product-information",
+        "product-media",
+        "product-coordinates",
+        "product-sizes",
+        "product-technologies",
+        "product-reviews",
+    ]
+
+    def __init__(self, settings):
+        self.settings = settings
+
     @classmethod
     def from_crawler(cls, crawler):
-        pipeline = cls()
+        pipeline = cls(crawler.settings)
         crawler.signals.connect(pipeline.spider_opened, signals.spider_opened)
         crawler.signals.connect(pipeline.spider_closed, signals.spider_closed)
         return pipeline
 
     def spider_opened(self, spider):
-        prefixes = [
-            "product-information",
-            "product-media",
-            "product-coordinates",
-            "product-sizes",
-            "product-technologies",
-            "product-reviews",
-        ]
-        location = create_directory("data/jsonlines", "jl", prefixes)
-
-        self.product_information_filename = "product-information-latest.jl"
-        self.product_information_file = open(f"{location}/{self.product_information_filename}", "w", encoding="utf-8")
-
-        self.product_media_filename = "product-media-latest.jl"
-        self.product_media_file = open(f"{location}/{self.product_media_filename}", "w", encoding="utf-8")
-
-        self.product_coordinates_filename = "product-coordinates-latest.jl"
-        self.product_coordinates_file = open(f"{location}/{self.product_coordinates_filename}", "w", encoding="utf-8")
-
-        self.product_size_filename = "product-sizes-latest.jl"
-        self.product_size_file = open(f"{location}/{self.product_size_filename}", "w", encoding="utf-8")
-
-        self.product_technology_filename = "product-technologies-latest.jl"
-        self.product_technology_file = open(f"{location}/{self.product_technology_filename}", "w", encoding="utf-8")
-
-        self.product_review_filename = "product-reviews-latest.jl"
-        self.product_review_file = open(f"{location}/{self.product_review_filename}", "w", encoding="utf-8")
-
-    def spider_closed(self, spider):
-        self.product_information_file.close()
-        self.product_media_file.close()
-        self.product_coordinates_file.close()
-        self.product_size_file.close()
-        self.product_technology_file.close()
-        self.product_review_file.close()
-        generate_product_spreadsheet()
+        self.spider = spider
+        self.unrecorded = {}
+        self.checkpoint = spider.checkpoint
+        self.incremental_store = spider.incremental_store
+        self.incremental_store.load("data/jsonlines", "jl", self.prefixes)
+
+        resumed = self.checkpoint.resumed
+        if resumed:
+            # the crawl goes on in the data version it was writing, nothing is rotated. The files are looked up
+            # by version, another run of the same day may have taken the -latest names since
+            state = self.checkpoint.state
+            self.location, self.version = state["location"], state["version"]
+            self.archive_version = state["archive_version"]
+            paths = {
+                prefix: resolve_version("data/jsonlines", "jl", state["date"], self.version, prefix)
+                for prefix in self.prefixes
+            }
+            archive = None
+            if self.archive_version:
+                archive = resolve_version(
+                    "data/archive",
+                    "jl.gz",
+                    state["date"],
+                    self.archive_version,
+                    RAW_ARCHIVE_PREFIX,
+                )
+            self.checkpoint.restore(paths, record_product_id, archive)
+            self.incremental_store.fingerprints.update(state["fingerprints"])
+            self.incremental_store.watermarks.update(state["watermarks"])
+        else:
+            self.location, self.version = allocate_version("data/jsonlines", "jl", self.prefixes)
+            paths = {prefix: f"{self.location}/{prefix}-latest.jl" for prefix in self.prefixes}
+            archive, self.archive_version = None, None
+            if self.settings.getbool("RAW_ARCHIVE_ENABLED"):
+                location, self.archive_version = allocate_version("data/archive", "jl.gz", [RAW_ARCHIVE_PREFIX])
+                archive = f"{location}/{RAW_ARCHIVE_PREFIX}-latest.jl.gz"
+
+        self.writer = JsonLinesWriter(
+            paths,
+            buffer_size=self.settings.getint("JSONLINES_BUFFER_SIZE"),
+            queue_size=self.settings.getint("JSONLINES_QUEUE_SIZE"),
+            encoder=self.settings.get("JSONLINES_ENCODER"),
+            append=resumed,
+        )
+
+        self.archive = None
+        if archive:
+            # the items as the spider assembled them, main.py reprocess builds the records again from these
+            self.archive = JsonLinesWriter(
+                {RAW_ARCHIVE_PREFIX: archive},
+                buffer_size=self.settings.getint("JSONLINES_BUFFER_SIZE"),
+                queue_size=self.settings.getint("JSONLINES_QUEUE_SIZE"),
+                encoder=self.settings.get("JSONLINES_ENCODER"),
+                compresslevel=self.settings.getint("RAW_ARCHIVE_COMPRESSION_LEVEL"),
+                append=resumed,
+            )
+
+        self.parquet = None
+        self.parquet_location = None
+        if self.settings.getbool("PARQUET_ENABLED") and columnar.pq is None:
+            spider.logger.warning("PARQUET_ENABLED is set but pyarrow is not installed, skipping parquet output")
+        elif self.settings.getbool("PARQUET_ENABLED") and resumed:
+            # parquet files are only complete once closed, there is nothing to append to
+            spider.logger.warning("Parquet output is not written for a resumed crawl")
+        elif self.settings.getbool("PARQUET_ENABLED"):
+            self.parquet_location = create_directory("data/parquet", "parquet", self.prefixes)
+            self.parquet = columnar.ParquetWriter(
+                {prefix: f"{self.parquet_location}/{prefix}-latest.parquet" for prefix in self.prefixes},
+                row_group_size=self.settings.getint("PARQUET_ROW_GROUP_SIZE"),
+                queue_size=self.settings.getint("JSONLINES_QUEUE_SIZE"),
+            )
+
+    def spider_closed(self, spider, reason):
+        if reason != "finished":
+            # stopped on purpose (Ctrl+C, closespider), main.py run --resume picks up from here. The checkpoint
+            # syncs the files, so it is saved before they are closed, and nothing is copied forward into them yet
+            self.save_checkpoint()
+            self.close_writers()
+            return
+
+        for prefix in self.prefixes:
+            for line, record in self.incremental_store.copy_forward(prefix):
+                self.writer.write_lines(prefix, [line])
+                if self.parquet:
+                    self.parquet.write(prefix, [record])
+        self.close_writers()
+
+        # only a finished crawl is the source of the next incremental run
+        self.incremental_store.save(self.location, self.writer.paths)
+        self.checkpoint.clear()
+        seal_version(self.location, self.version)
+        if self.archive:
+            seal_version(os.path.dirname(self.archive.paths[RAW_ARCHIVE_PREFIX]), self.archive_version)
+        if self.parquet:
+            seal_version(self.parquet_location)
+
+    def close_writers(self):
+        self.writer.close()
+        if self.archive:
+            self.archive.close()
+        if self.parquet:
+            self.parquet.close()
+
+    def record_complete(self, article: str):
+        # articles with a failed part are not fingerprinted, so the next incremental run crawls them again
+        product_stat, watermark = self.unrecorded.pop(article)
+        if article not in self.spider.partial:
+            self.incremental_store.record(product_stat, watermark)
+
+    def save_checkpoint(self):
+        offsets = self.writer.sync()
+        if self.archive:
+            self.archive.sync()
+
+        completed = self.checkpoint.completed
+        fingerprints = self.incremental_store.fingerprints
+        watermarks = self.incremental_store.watermarks
+        self.checkpoint.save(
+            {
+                "run_id": versions.RUN_ID,
+                "location": self.location,
+                "version": self.version,
+                "archive_version": self.archive_version,
+                "date": os.path.basename(self.location),
+                "offsets": offsets,
+                "limit": self.spider.limit,
+                "fan_out": self.spider.fan_out,
+                "fingerprints": {article: value for article, value in fingerprints.items() if article in completed},
+                "watermarks": {article: value for article, value in watermarks.items() if article in completed},
+            }
+        )
 
     def process_item(self, item, spider):
-        product = ItemAdapter(item).asdict()
+        if isinstance(item, ReviewBatch):
+            return self.process_review_batch(item)
 
-        product_information = process_product_information(product)
-        product_information = json.dumps(product_information, ensure_ascii=False) + "\n"
-        self.product_information_file.write(product_information)
-
-        if product["api_info"]["product"]["article"]["image"]:
-            product_media = process_product_media(product)
-            for media_record in product_media:
-                media_record = json.dumps(media_record, ensure_ascii=False) + "\n"
-                self.product_media_file.write(media_record)
-
-        if product["api_info"]["product"]["article"]["coordinates"]:
-            product_coordinates = process_product_coordinates(product)
-            for product_coordinate in product_coordinates:
-                product_coordinate = json.dumps(product_coordinate, ensure_ascii=False) + "\n"
-                self.product_coordinates_file.write(product_coordinate)
-
-        if product["size_chart"]:
-            product_sizes = process_product_sizes(product)
-            for product_size in product_sizes:
-                product_size = json.dumps(product_size, ensure_ascii=False) + "\n"
-                self.product_size_file.write(product_size)
-
-        if product["api_info"]["product"]["model"]["description"]["technology"]:
-            product_technologies = process_product_technologies(product)
-            for product_technology in product_technologies:
-                product_technology = json.dumps(product_technology, ensure_ascii=False) + "\n"
-                self.product_technology_file.write(product_technology)
-
-        if product["review_data"]:
-            product_reviews = process_product_reviews(product)
-            for product_review in product_reviews:
-                product_review = json.dumps(product_review, ensure_ascii=False) + "\n"
-                self.product_review_file.write(product_review)
+        product = ItemAdapter(item).asdict()
+        if self.archive:
+            self.archive.write(RAW_ARCHIVE_PREFIX, [product])
+
+        for prefix, records in process_product(product).items():
+            self.writer.write(prefix, records)
+            if self.parquet:
+                self.parquet.write(prefix, records)
+
+        # with reviews on the way the article is complete once its last review batch is written
+        article = product["product_stat"]["article"]
+        self.unrecorded[article] = (product["product_stat"], product["review_data"].get("watermark"))
+        if self.checkpoint.product_written(article, bool(product["review_data"])):
+            self.record_complete(article)
+        if self.checkpoint.due():
+            self.save_checkpoint()
 
         return f"Product from {product['product_data']['url']} scraped successfully."
+
+    def process_review_batch(self, batch: ReviewBatch):
+        if self.archive:
+            self.archive.write(RAW_ARCHIVE_PREFIX, [{"review_batch": ItemAdapter(batch).asdict()}])
+
+        records = process_review_batch(batch.product_id, batch.product_name, batch.reviews)
+        self.writer.write("product-reviews", records)
+        if self.parquet:
+            self.parquet.write("product-reviews", records)
+
+        if batch.last and batch.incremental:
+            # only the new reviews were crawled, the known ones are copied from the previous version
+            self.incremental_store.carry_reviews({"article": batch.product_id})
+        if batch.last and self.checkpoint.reviews_written(batch.product_id):
+            self.record_complete(batch.product_id)
+
+        return f"{len(records)} reviews of {batch.product_id} written."
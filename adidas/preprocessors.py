@@ -1,4 +1,11 @@
-from adidas.items import CoordinatedProduct, ProductInformation, ProductMedia, ProductReview, ProductTechnology
+from adidas.items import (
+    CoordinatedProduct,
+    ProductInformation,
+    ProductMedia,
+    ProductReview,
+    ProductTechnology,
+    validate_records,
+)
 
 
 def sanitize_size_chart_data(data):
@@ -20,6 +27,59 @@ def sanitize_size_chart_data(data):
     return result
 
 
+def slim_api_info(data):
+    # only the parts of the product api the processors below read, in the same shape, so the
+    # rest of the payload is not held while the size chart and reviews of the product download
+    try:
+        article = data["product"]["article"]
+        image = article["image"]
+        coordinates = article["coordinates"]
+        technology = data["product"]["model"]["description"]["technology"]
+        return {
+            "page": {"categories": data["page"]["categories"]},
+            "product": {
+                "article": {
+                    "price": {"current": {"withTax": article["price"]["current"]["withTax"]}},
+                    "description": {"messages": {"mainText": article["description"]["messages"]["mainText"]}},
+                    "image": {
+                        "details": [
+                            {"imageUrl": {"large": detail["imageUrl"]["large"]}} for detail in image["details"]
+                        ],
+                        "videos": [{"movieUrl": video["movieUrl"]} for video in image["videos"]],
+                    }
+                    if image
+                    else image,
+                    "coordinates": {
+                        "articles": [
+                            {
+                                "articleCode": coordinated_product["articleCode"],
+                                "name": coordinated_product["name"],
+                                "price": {"current": {"withTax": coordinated_product["price"]["current"]["withTax"]}},
+                                "image": coordinated_product["image"],
+                            }
+                            for coordinated_product in coordinates["articles"]
+                        ]
+                    }
+                    if coordinates
+                    else coordinates,
+                },
+                "model": {
+                    "description": {
+                        "technology": [
+                            {"name": tech["name"], "text": tech["text"], "imagePath": tech["imagePath"]}
+                            for tech in technology
+                        ]
+                        if technology
+                        else technology
+                    }
+                },
+            },
+        }
+    except (KeyError, TypeError):
+        # an unexpected payload is kept whole, processing it fails in the pipeline the way it always did
+        return data
+
+
 def process_product_information(product):
     processed_data = {
         "product_id": product["product_stat"]["article"],
@@ -45,50 +105,49 @@ def process_product_information(product):
         processed_data["material_quality_rate"] = product["review_data"]["material_quality_rate"]
         processed_data["comfort_rate"] = product["review_data"]["comfort_rate"]
 
-    processed_data = ProductInformation(**processed_data)
-    return processed_data.dict()
+    return validate_records(ProductInformation, [processed_data])[0]
 
 
 def process_product_media(product):
     result = []
     for image in product["api_info"]["product"]["article"]["image"]["details"]:
         result.append(
-            ProductMedia(
-                product_id=product["product_stat"]["article"],
-                product_name=product["product_data"]["name"],
-                type="image",
-                url=f"https://shop.adidas.jp{image['imageUrl']['large']}",
-            ).dict(),
+            {
+                "product_id": product["product_stat"]["article"],
+                "product_name": product["product_data"]["name"],
+                "type": "image",
+                "url": f"https://shop.adidas.jp{image['imageUrl']['large']}",
+            }
         )
 
     for video in product["api_info"]["product"]["article"]["image"]["videos"]:
         result.append(
-            ProductMedia(
-                product_id=product["product_stat"]["article"],
-                product_name=product["product_data"]["name"],
-                type="video",
-                url=video["movieUrl"],
-            ).dict(),
+            {
+                "product_id": product["product_stat"]["article"],
+                "product_name": product["product_data"]["name"],
+                "type": "video",
+                "url": video["movieUrl"],
+            }
         )
 
-    return result
+    return validate_records(ProductMedia, result)
 
 
 def process_product_coordinates(product):
     result = []
     for coordinated_product in product["api_info"]["product"]["article"]["coordinates"]["articles"]:
         result.append(
-            CoordinatedProduct(
-                main_product_id=product["product_stat"]["article"],
-                main_product_name=product["product_data"]["name"],
-                coordinated_product_number=coordinated_product["articleCode"],
-                coordinated_product_name=coordinated_product["name"],
-                coordinated_product_price=coordinated_product["price"]["current"]["withTax"],
-                coordinated_product_page_url=coordinated_product["articleCode"],
-                coordinated_product_image_url=coordinated_product["image"],
-            ).dict(),
+            {
+                "main_product_id": product["product_stat"]["article"],
+                "main_product_name": product["product_data"]["name"],
+                "coordinated_product_number": coordinated_product["articleCode"],
+                "coordinated_product_name": coordinated_product["name"],
+                "coordinated_product_price": coordinated_product["price"]["current"]["withTax"],
+                "coordinated_product_page_url": coordinated_product["articleCode"],
+                "coordinated_product_image_url": coordinated_product["image"],
+            }
         )
-    return result
+    return validate_records(CoordinatedProduct, result)
 
 
 def process_product_sizes(product):
@@ -109,25 +168,55 @@ def process_product_technologies(product):
     result = []
     for tech in product["api_info"]["product"]["model"]["description"]["technology"]:
         result.append(
-            ProductTechnology(
-                product_id=product["product_stat"]["article"],
-                product_name=product["product_data"]["name"],
-                technology_name=tech["name"],
-                description=tech["text"],
-                image_url=tech["imagePath"],
-            ).dict(),
+            {
+                "product_id": product["product_stat"]["article"],
+                "product_name": product["product_data"]["name"],
+                "technology_name": tech["name"],
+                "description": tech["text"],
+                "image_url": tech["imagePath"],
+            }
         )
-    return result
+    return validate_records(ProductTechnology, result)
 
 
-def process_product_reviews(product):
+def process_review_batch(product_id, product_name, reviews):
     product_reviews = []
-    for review in product["review_data"]["reviews"]:
+    for review in reviews:
         product_reviews.append(
-            ProductReview(
-                product_id=product["product_stat"]["article"],
-                product_name=product["product_data"]["name"],
+            {
+                "product_id": product_id,
+                "product_name": product_name,
                 **review,
-            ).dict(),
+            }
         )
-    return product_reviews
+    return validate_records(ProductReview, product_reviews)
+
+
+def process_product_reviews(product):
+    return process_review_batch(
+        product["product_stat"]["article"],
+        product["product_data"]["name"],
+        product["review_data"]["reviews"],
+    )
+
+
+def process_product(product):
+    records = {"product-information": [process_product_information(product)]}
+
+    if product["api_info"]["product"]["article"]["image"]:
+        records["product-media"] = process_product_media(product)
+
+    if product["api_info"]["product"]["article"]["coordinates"]:
+        records["product-coordinates"] = process_product_coordinates(product)
+
+    if product["size_chart"]:
+        records["product-sizes"] = process_product_sizes(product)
+
+    if product["api_info"]["product"]["model"]["description"]["technology"]:
+        records["product-technologies"] = process_product_technologies(product)
+
+    # reviews usually arrive separately as review batches, only archived items of older runs carry them
+    if product["review_data"].get("reviews"):
+        records["product-reviews"] = process_product_reviews(product)
+
+    return records
@@ -0,0 +1,269 @@
+import json
+import math
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Callable, Dict, Tuple, Union
+from urllib.parse import parse_qsl, urlencode, urlparse
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+
+from adidas.utils import scrapy_environment
+
+# reviews are cached per model and fetched for whichever article of the model comes first, that differs run to run
+REPLAY_IGNORED_PARAMS = ("productattribute_itemKcod",)
+
+# headers that describe the recorded transfer rather than the response, they are rebuilt when replaying
+HOP_HEADERS = {b"content-length", b"transfer-encoding", b"connection", b"keep-alive"}
+
+
+def replay_key(url: str) -> str:
+    # host, path and query of a url, the scheme is left out so https requests can be served over http
+    return url.split("://", 1)[1]
+
+
+def loose_key(key: str, ignored_params) -> str:
+    path, _, query = key.partition("?")
+    params = [(name, value) for name, value in parse_qsl(query, keep_blank_values=True) if name not in ignored_params]
+    return f"{path}?{urlencode(params)}" if params else path
+
+
+class RecordMiddleware:
+    # placed after the retry, redirect and compression middlewares, responses are stored as they came over the wire
+    def __init__(self, path: str, commit_every: int):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB)"
+        )
+        self.commit_every = commit_every
+        self.uncommitted = 0
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        path = crawler.settings.get("RECORD_PATH")
+        if not path:
+            raise NotConfigured
+
+        middleware = cls(path, crawler.settings.getint("RECORD_COMMIT_EVERY", 500))
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def process_response(self, request, response, spider):
+        if "://" not in request.url:
+            # data: requests of the spider itself
+            return response
+
+        # the last response of a retried url wins, that is the one the spider saw
+        headers = [
+            [name.decode("latin-1"), value.decode("latin-1")]
+            for name, values in response.headers.items()
+            if name.lower() not in HOP_HEADERS
+            for value in values
+        ]
+        self.connection.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+            (replay_key(request.url), response.status, json.dumps(headers), response.body),
+        )
+        self.uncommitted += 1
+        if self.uncommitted >= self.commit_every:
+            self.connection.commit()
+            self.uncommitted = 0
+
+        spider.crawler.stats.inc_value("replay/recorded")
+        return response
+
+    def spider_closed(self, spider):
+        self.connection.commit()
+        self.connection.close()
+
+
+class ReplayMiddleware:
+    # sends every request to the replay server, the spider still sees the original urls
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        url = crawler.settings.get("REPLAY_URL")
+        if not url:
+            raise NotConfigured
+        return cls(url)
+
+    def process_request(self, request, spider):
+        if request.url.startswith(f"{self.url}/") or "://" not in request.url:
+            # already rewritten, a redirect to a recorded location comes back with its real url and is rewritten again
+            return None
+
+        meta = {
+            **request.meta,
+            "replay_original_url": request.url,
+            # requests keep the download slot of their real host, so per-domain concurrency behaves as it would live
+            "download_slot": request.meta.get("download_slot", urlparse(request.url).hostname),
+        }
+        return request.replace(url=f"{self.url}/{replay_key(request.url)}", meta=meta)
+
+    def process_response(self, request, response, spider):
+        if "replay_original_url" in request.meta:
+            return response.replace(url=request.meta["replay_original_url"])
+        return response
+
+
+def latency_sampler(
+    distribution: str,
+    mean: float,
+    jitter: float,
+    seed: Union[int, None] = None,
+) -> Callable[[], float]:
+    generator = random.Random(seed)
+    if distribution == "constant":
+        return lambda: mean
+    if distribution == "uniform":
+        return lambda: max(0.0, generator.uniform(mean - jitter, mean + jitter))
+    if distribution == "normal":
+        return lambda: max(0.0, generator.gauss(mean, jitter))
+    if distribution == "exponential":
+        return lambda: generator.expovariate(1 / mean) if mean > 0 else 0.0
+    if distribution == "lognormal":
+        if mean <= 0:
+            return lambda: 0.0
+        # parameters of the underlying normal distribution, so the samples have the given mean and deviation
+        sigma = math.sqrt(math.log(1 + jitter**2 / mean**2))
+        mu = math.log(mean) - sigma**2 / 2
+        return lambda: generator.lognormvariate(mu, sigma)
+    raise ValueError(f"Unknown latency distribution: {distribution}")
+
+
+def load_recording(path: str) -> Dict[str, Tuple[int, list, bytes]]:
+    if not Path(path).exists():
+        raise FileNotFoundError(f"No recorded crawl at {path}")
+
+    connection = sqlite3.connect(path)
+    try:
+        rows = connection.execute("SELECT key, status, headers, body FROM responses").fetchall()
+    finally:
+        connection.close()
+    return {key: (status, json.loads(headers), body) for key, status, headers, body in rows}
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        server = self.server
+        time.sleep(server.latency())
+
+        key = self.path[1:]
+        recorded = server.responses.get(key) or server.loose_responses.get(loose_key(key, server.ignored_params))
+        if recorded is None:
+            server.misses += 1
+            status, headers, body = 404, [], b""
+        else:
+            status, headers, body = recorded
+
+        self.send_response(status)
+        for name, value in headers:
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class ReplayServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(
+        self,
+        responses: Dict[str, Tuple[int, list, bytes]],
+        latency: Callable[[], float],
+        port: int = 0,
+        ignored_params=REPLAY_IGNORED_PARAMS,
+    ):
+        super().__init__(("127.0.0.1", port), ReplayHandler)
+        self.responses = responses
+        # fallback for requests that were recorded under other values of the ignored parameters
+        self.ignored_params = set(ignored_params)
+        self.loose_responses = {loose_key(key, self.ignored_params): response for key, response in responses.items()}
+        self.latency = latency
+        self.misses = 0
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+
+def read_crawl_stats(workdir: str) -> dict:
+    sources = sorted(Path(workdir).glob("data/stats/*/latest.json"))
+    if not sources:
+        raise RuntimeError(f"The benchmark crawl left no stats, see {workdir}/crawl.log")
+    with open(sources[-1], "r") as reader:
+        return json.loads(reader.read())
+
+
+def run_benchmark(
+    recording: str,
+    limit: Union[int, None] = None,
+    fan_out: bool = False,
+    latency: float = 0.05,
+    jitter: float = 0.02,
+    distribution: str = "lognormal",
+    keep: bool = False,
+) -> dict:
+    server = ReplayServer(load_recording(recording), latency_sampler(distribution, latency, jitter))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    # the crawl runs in a scratch directory, its outputs never mix with the ones under ./data
+    workdir = tempfile.mkdtemp(prefix="adidas-bench-")
+    command = [
+        sys.executable, "-m", "scrapy", "crawl", "products",
+        "-s", f"REPLAY_URL={server.url}",
+        "-s", "ROBOTSTXT_OBEY=False",
+        "-s", "LOG_FILE=crawl.log",
+    ]  # fmt: skip
+    if limit:
+        command.extend(["-a", f"limit={limit}"])
+    if fan_out:
+        command.extend(["-a", "fan_out=true"])
+
+    # the crawl is the only child process, so the children usage is the usage of the crawl
+    usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    try:
+        subprocess.run(command, cwd=workdir, env=scrapy_environment(), check=True)
+        usage_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+        stats = read_crawl_stats(workdir)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # a failed crawl leaves its directory behind for the log
+    if not keep:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    # review batches are items as well, the finished products are counted by the item latency histogram
+    items = stats.get("latency/item/product/count", 0)
+    elapsed = stats.get("elapsed_time_seconds", 0.0)
+    cpu_seconds = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    return {
+        "items": items,
+        "seconds": round(elapsed, 3),
+        "items_per_second": round(items / elapsed, 3) if elapsed else 0.0,
+        "cpu_ms_per_item": round(1000 * cpu_seconds / items, 3) if items else 0.0,
+        # ru_maxrss is in kilobytes on linux
+        "peak_memory_mb": round(usage_after.ru_maxrss / 1024, 1),
+        "p99_item_latency": stats.get("latency/item/product/p99", 0.0),
+        "responses": stats.get("downloader/response_count", 0),
+        "replay_misses": server.misses,
+        "workdir": workdir if keep else None,
+    }
@@ -1,23 +1,25 @@
-from datetime import datetime
+from typing import Union
 
 import matplotlib.pyplot as plt
 import pandas as pd
 import seaborn as sns
 from matplotlib.patches import FancyBboxPatch
 
-from adidas.utils import create_directory
+from adidas.telemetry import Endpoint, read_telemetry
+from adidas.utils import create_directory, versioned_file
+from adidas.versions import related_version, seal_version
 
 sns.set_style("darkgrid", {"axes.facecolor": "#62946050"})
 
 
-def load_data():
-    current_date = datetime.now().date().isoformat()
-    location = f"data/dashboard/{current_date}/latest.jl"
-    df = pd.read_json(location, lines=True)
+def load_data(date: Union[str, None] = None, version: Union[int, None] = None):
+    location = versioned_file("data/dashboard", "bin", date, related_version("data/dashboard", "bin", date, version))
+    df = pd.DataFrame(read_telemetry(location))
 
-    # Convert "sent_at" and "received_at" columns to datetime format
-    df["sent_at"] = pd.to_datetime(df["sent_at"])
-    df["received_at"] = pd.to_datetime(df["received_at"])
+    # Convert "sent_at" and "received_at" columns from unix seconds to datetime format
+    df["sent_at"] = pd.to_datetime(df["sent_at"], unit="s")
+    df["received_at"] = pd.to_datetime(df["received_at"], unit="s")
+    df["endpoint"] = df["endpoint"].map(lambda value: Endpoint(value).name.lower())
 
     df["download_time"] = (df["received_at"] - df["sent_at"]).dt.total_seconds()
 
@@ -70,13 +72,19 @@ def plot_timeseries(ax, ts):
     ax.set_ylabel("Downloaded bytes / s")
 
 
-def save_report(fig):
-    location = create_directory("data/report", "png")
+def save_report(fig, date: Union[str, None] = None):
+    location = create_directory("data/report", "png", date=date)
     fig.savefig(f"{location}/latest.png")
+    seal_version(location)
 
 
-def create_dashboard(save: bool = True):
-    df = load_data()
+def create_dashboard(
+    save: bool = True,
+    show: bool = True,
+    date: Union[str, None] = None,
+    version: Union[int, None] = None,
+):
+    df = load_data(date, version)
     kpis = get_kpis(df)
     ts = create_timeseries(df)
 
@@ -94,6 +102,8 @@ def create_dashboard(save: bool = True):
     fig.suptitle("Scraper Performance Report", color="#243119", fontsize=36, fontweight="bold")
 
     if save:
-        save_report(fig)
+        save_report(fig, date)
 
-    plt.show()
+    if show:
+        plt.show()
+    plt.close(fig)
@@ -0,0 +1,107 @@
+import gzip
+import json
+import logging
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Dict, Iterator, List, Union
+
+from adidas import settings
+from adidas.pipelines import RAW_ARCHIVE_PREFIX, AdidasPipeline
+from adidas.preprocessors import process_product, process_review_batch
+from adidas.utils import versioned_file
+from adidas.versions import allocate_version, seal_version, version_run_id
+from adidas.writers import JsonLinesWriter, json_encoder
+
+logger = logging.getLogger(__name__)
+
+
+def read_batches(path: str, batch_size: int) -> Iterator[List[bytes]]:
+    batch = []
+    with gzip.open(path, "rb") as reader:
+        for line in reader:
+            batch.append(line)
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def process_batch(lines: List[bytes]) -> dict:
+    # runs in a worker, the records come back encoded so the parent process only writes them
+    encode = json_encoder(settings.JSONLINES_ENCODER)
+    lines_by_prefix = {prefix: [] for prefix in AdidasPipeline.prefixes}
+    failed = []
+    for line in lines:
+        product = json.loads(line)
+        try:
+            if "review_batch" in product:
+                batch = product["review_batch"]
+                reviews = process_review_batch(batch["product_id"], batch["product_name"], batch["reviews"])
+                records = {"product-reviews": reviews}
+            else:
+                records = process_product(product)
+        except Exception as error:
+            if "review_batch" in product:
+                item = product["review_batch"]["product_id"]
+            else:
+                item = product["product_stat"]["article"]
+            failed.append(f"{item}: {error!r}")
+            continue
+
+        for prefix, prefix_records in records.items():
+            lines_by_prefix[prefix].extend(encode(record) for record in prefix_records)
+    return {"lines": lines_by_prefix, "items": len(lines) - len(failed), "failed": failed}
+
+
+def reprocess_archive(
+    date: Union[str, None] = None,
+    version: Union[int, None] = None,
+    workers: Union[int, None] = None,
+    batch_size: int = 200,
+) -> Dict[str, int]:
+    source = versioned_file("data/archive", "jl.gz", date, version, prefix=RAW_ARCHIVE_PREFIX)
+    if not Path(source).exists():
+        raise FileNotFoundError(f"No archived items at {source}, crawl with RAW_ARCHIVE_ENABLED first")
+
+    # a new version next to the data of the archived crawl, under the run id of that crawl so its stats and
+    # telemetry are found for the reports
+    run_id = version_run_id("data/archive", "jl.gz", date, version)
+    location, _ = allocate_version("data/jsonlines", "jl", AdidasPipeline.prefixes, date=date, run_id=run_id)
+    writer = JsonLinesWriter(
+        {prefix: f"{location}/{prefix}-latest.jl" for prefix in AdidasPipeline.prefixes},
+        buffer_size=settings.JSONLINES_BUFFER_SIZE,
+        queue_size=settings.JSONLINES_QUEUE_SIZE,
+    )
+
+    workers = workers or os.cpu_count()
+    summary = {"items": 0, "failed": 0, **{prefix: 0 for prefix in AdidasPipeline.prefixes}}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as executor:
+        # a few batches per worker in flight, the archive is never read into memory as a whole
+        pending = deque()
+        batches = read_batches(source, batch_size)
+        for batch in batches:
+            pending.append(executor.submit(process_batch, batch))
+            if len(pending) >= 2 * workers:
+                write_result(writer, pending.popleft().result(), summary)
+        while pending:
+            write_result(writer, pending.popleft().result(), summary)
+
+    writer.close()
+    seal_version(location)
+    return summary
+
+
+def write_result(writer: JsonLinesWriter, result: dict, summary: Dict[str, int]):
+    # results are taken in submission order, so the records keep the order of the archive
+    for prefix, lines in result["lines"].items():
+        writer.write_lines(prefix, lines)
+        summary[prefix] += len(lines)
+
+    summary["items"] += result["items"]
+    summary["failed"] += len(result["failed"])
+    for failure in result["failed"]:
+        logger.warning("Failed to process %s", failure)
@@ -0,0 +1,208 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+from scrapy.selector import Selector
+
+from adidas.extractors import compile_selector
+
+MATERIALS_MARKER = b"var materials="
+REVIEW_BLOCK_SELECTOR = "#BVSubmissionPopupContainer"
+REVIEW_SUMMARY_SELECTORS = {
+    "rating": "#BVRRRatingOverall_ > div.BVRRRatingNormalOutOf > span.BVRRNumber.BVRRRatingNumber::text",
+    "number_of_reviews": "span.BVRRNumber.BVRRBuyAgainTotal::text",
+    "recommended_rate": "span.BVRRBuyAgainPercentage > span.BVRRNumber::text",
+    "sense_of_fit_rate": "div.BVRRSecondaryRatingsContainer div.BVRRRatingFit img::attr(title)",
+    "appropriation_of_length_rate": "div.BVRRSecondaryRatingsContainer div.BVRRRatingLength img::attr(title)",
+    "material_quality_rate": "div.BVRRSecondaryRatingsContainer div.BVRRRatingQuality img::attr(title)",
+    "comfort_rate": "div.BVRRSecondaryRatingsContainer div.BVRRRatingComfort img::attr(title)",
+}
+REVIEW_SELECTORS = {
+    "review_date": "span.BVRRReviewDate::text",
+    "review_rating": "#BVRRRatingOverall_Review_Display > div.BVRRRatingNormalImage > img::attr(title)",
+    "review_title": "span.BVRRReviewTitle::text",
+    "review_description": "span.BVRRReviewText::text",
+    "reviewer_id": "span.BVRRNickname::text",
+}
+
+
+def review_watermark(review: dict) -> dict:
+    identity = f"{review['review_date']}\x1f{review['reviewer_id']}\x1f{review['review_title']}"
+    return {"review_date": review["review_date"], "key": hashlib.sha1(identity.encode("utf-8")).hexdigest()}
+
+
+class ReviewWalk:
+    def __init__(
+        self,
+        total_pages: int,
+        concurrency: int,
+        watermark: Union[dict, None] = None,
+        horizon: Union[int, None] = None,
+        serial: int = 0,
+        retain_limit: int = 0,
+    ):
+        self.total_pages = total_pages
+        self.concurrency = concurrency
+        self.watermark = watermark
+        self.horizon = min(horizon or total_pages, total_pages)
+        self.serial = serial
+        self.next_page = 2
+        self.pages = {}
+        self.known_from = {}
+        self.summary = {}
+        self.failed = False
+        self.released_through = 0
+        # the articles the pages are handed to, and the ones that asked for the model after the walk started
+        self.recipients = []
+        self.late = []
+        # released reviews are kept for the model cache only while there are few of them
+        self.retain_limit = retain_limit
+        self.retained = []
+        self.head_data = None
+
+    @property
+    def in_flight(self) -> int:
+        return self.next_page - 1 - len(self.pages)
+
+    @property
+    def cut_page(self) -> Union[int, None]:
+        return min(self.known_from) if self.known_from else None
+
+    @property
+    def complete(self) -> bool:
+        last_page = self.cut_page or self.total_pages
+        return all(page in self.pages for page in range(1, last_page + 1))
+
+    def add(self, page: int, reviews: List[dict], failed: bool = False):
+        self.pages[page] = reviews
+        self.failed = self.failed or failed
+
+        # reviews come newest first, everything from the last known review onwards was stored by a previous run
+        if self.watermark:
+            for index, review in enumerate(reviews):
+                if review_watermark(review)["key"] == self.watermark["key"]:
+                    self.known_from[page] = index
+                    break
+
+    def schedule(self) -> List[int]:
+        # pages still to request, keeping at most `concurrency` of them in flight
+        if not self.known_from and all(page in self.pages for page in range(1, self.horizon + 1)):
+            # the last known review was not within the expected pages, fall back to the whole set
+            self.horizon = self.total_pages
+
+        pages = []
+        last_page = min(self.cut_page or self.total_pages, self.horizon)
+        while self.next_page <= last_page and self.in_flight < self.concurrency:
+            pages.append(self.next_page)
+            self.next_page += 1
+        return pages
+
+    def head(self) -> dict:
+        # what the product record needs from the reviews, known once the first page is in
+        first_page = self.pages.get(1)
+        watermark = review_watermark(first_page[0]) if first_page else self.watermark
+        return {**self.summary, "watermark": watermark}
+
+    def release(self) -> List[dict]:
+        # reviews of the pages next in order, a page is dropped once it is handed out
+        reviews = []
+        last_page = self.cut_page or self.total_pages
+        while self.released_through < last_page and self.pages.get(self.released_through + 1) is not None:
+            page = self.released_through + 1
+            if page == self.cut_page:
+                reviews.extend(self.pages[page][: self.known_from[page]])
+            else:
+                reviews.extend(self.pages[page])
+            self.pages[page] = []
+            self.released_through = page
+
+        if self.retained is not None and len(self.retained) + len(reviews) <= self.retain_limit:
+            self.retained.extend(reviews)
+        else:
+            self.retained = None
+        return reviews
+
+    def cached_data(self) -> Union[dict, None]:
+        if self.failed or self.retained is None:
+            return None
+        return {"head": self.head_data, "reviews": self.retained, "incremental": self.cut_page is not None}
+
+
+def parse_review_page_with_css(body: bytes, summary: bool) -> Tuple[Union[dict, None], List[dict]]:
+    for line in body.decode().split("\n"):
+        if line.startswith("var materials="):
+            review_info = json.loads(line.replace("var materials=", "")[:-1])
+            review_html = Selector(text=review_info["BVRRSourceID"].replace("\\", ""), type="html")
+
+    page_summary = None
+    if summary:
+        page_summary = {field: review_html.css(css).get() for field, css in REVIEW_SUMMARY_SELECTORS.items()}
+
+    reviews = []
+    for review_section in review_html.css(REVIEW_BLOCK_SELECTOR):
+        reviews.append({field: review_section.css(css).get() for field, css in REVIEW_SELECTORS.items()})
+    return page_summary, reviews
+
+
+COMPILED_REVIEW_BLOCK = compile_selector(REVIEW_BLOCK_SELECTOR)
+COMPILED_SUMMARY_SELECTORS = {field: compile_selector(css) for field, css in REVIEW_SUMMARY_SELECTORS.items()}
+COMPILED_REVIEW_SELECTORS = {field: compile_selector(css) for field, css in REVIEW_SELECTORS.items()}
+
+
+def locate_materials(body: bytes) -> bytes:
+    # the payload is the last line starting with the marker, up to the semicolon closing the line
+    start = body.rfind(b"\n" + MATERIALS_MARKER) + 1
+    if not body.startswith(MATERIALS_MARKER, start):
+        raise ValueError("Review page without a materials payload")
+
+    end = body.find(b"\n", start)
+    return body[start + len(MATERIALS_MARKER) : (end if end != -1 else len(body)) - 1]
+
+
+def first_match(xpath, node) -> Union[str, None]:
+    matches = xpath(node)
+    return matches[0] if matches else None
+
+
+def parse_review_page(body: bytes, summary: bool) -> Tuple[Union[dict, None], List[dict]]:
+    review_info = json.loads(locate_materials(body))
+    root = Selector(text=review_info["BVRRSourceID"].replace("\\", ""), type="html").root
+
+    page_summary = None
+    if summary:
+        page_summary = {field: first_match(xpath, root) for field, xpath in COMPILED_SUMMARY_SELECTORS.items()}
+
+    reviews = []
+    for review_section in COMPILED_REVIEW_BLOCK(root):
+        reviews.append(
+            {field: first_match(xpath, review_section) for field, xpath in COMPILED_REVIEW_SELECTORS.items()}
+        )
+    return page_summary, reviews
+
+
+REVIEW_PAGE_PARSERS = {
+    "css": parse_review_page_with_css,
+    "compiled": parse_review_page,
+}
+
+
+def benchmark_review_parsers(location: str, rounds: int = 5) -> Dict[str, float]:
+    pages = [path.read_bytes() for path in sorted(Path(location).glob("*.djs"))]
+    if not pages:
+        raise FileNotFoundError(f"No recorded review responses (*.djs) in {location}")
+
+    for body in pages:
+        results = [parser(body, summary=True) for parser in REVIEW_PAGE_PARSERS.values()]
+        if any(result != results[0] for result in results):
+            raise ValueError("Review page parsers disagree")
+
+    report = {}
+    for name, parser in REVIEW_PAGE_PARSERS.items():
+        started_at = time.perf_counter()
+        for _ in range(rounds):
+            for body in pages:
+                parser(body, summary=True)
+        report[name] = len(pages) * rounds / (time.perf_counter() - started_at)
+    return report
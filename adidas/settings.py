@@ -44,14 +44,18 @@ SPIDER_MIDDLEWARES = {
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
+    "adidas.replay.ReplayMiddleware": 50,
     "adidas.middlewares.AdidasDownloaderMiddleware": 543,
+    "adidas.replay.RecordMiddleware": 650,
 }
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    # "scrapy.extensions.telnet.TelnetConsole": None,
+    "adidas.extensions.MetricsExtension": 500,
+    "adidas.extensions.AdaptiveConcurrency": 510,
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -78,7 +82,119 @@ ITEM_PIPELINES = {
 # HTTPCACHE_EXPIRATION_SECS = 0
 # HTTPCACHE_DIR = "httpcache"
 # HTTPCACHE_IGNORE_HTTP_CODES = []
-# HTTPCACHE_STORAGE = "scrapy.extensions.httpcache.FilesystemCacheStorage"
+HTTPCACHE_STORAGE = "adidas.httpcache.SQLiteCacheStorage"
+
+# Expiration of the cached responses per endpoint, HTTPCACHE_EXPIRATION_SECS
+# applies to the rest (0 keeps them forever)
+HTTPCACHE_ENDPOINT_EXPIRATION_SECS = {
+    "catalogue": 3600,
+    "product_page": 86400,
+    "product_api": 86400,
+    "size_chart": 30 * 86400,
+    "reviews": 7 * 86400,
+}
+
+# Compressed bytes kept in the cache before the least recently used responses
+# are evicted (0 for no bound), and the compression of the bodies (zstd falls
+# back to gzip when zstandard is not installed)
+HTTPCACHE_MAX_SIZE = 2 * 1024**3
+HTTPCACHE_COMPRESSION = "zstd"
+
+# Seconds to wait for every part of a fanned out product (-a fan_out=true) before
+# emitting it without the missing parts
+PRODUCT_JOIN_TIMEOUT = 300
+
+# Number of model codes whose size chart and reviews are kept for the other
+# articles (colourways) of the same model
+MODEL_CACHE_SIZE = 1000
+
+# Number of review pages of a single product requested at the same time once
+# the first page is in
+REVIEW_PAGE_CONCURRENCY = 4
+
+# Articles claimed by the crawler processes of a sharded run (main.py run
+# --workers N), set for every shard by the run command
+FRONTIER_PATH = None
+
+# Reviews of a model kept for the articles that ask for it once its walk is
+# done, models with more reviews are walked again for them
+REVIEW_CACHE_MAX_REVIEWS = 500
+
+# Fingerprints of the catalogue entries written by the last run, used by
+# incremental runs (-a incremental=true) to skip articles that did not change.
+# Catalogue fields listed in INCREMENTAL_IGNORED_FIELDS do not count as a change
+INCREMENTAL_STATE_PATH = "data/incremental/state.json"
+INCREMENTAL_IGNORED_FIELDS = []
+
+# Every CHECKPOINT_INTERVAL seconds the written offsets and the finished
+# articles are saved, a crawl that stopped halfway goes on from there with
+# `main.py run --resume` (-a resume=true). Set to 0 to turn it off
+CHECKPOINT_PATH = "data/checkpoint/state.json"
+CHECKPOINT_INTERVAL = 60
+
+# Records are serialized into per-file buffers that are handed to a background
+# thread every JSONLINES_BUFFER_SIZE bytes, at most JSONLINES_QUEUE_SIZE chunks
+# wait for the disk before processing items blocks. Set JSONLINES_ENCODER to
+# "orjson" to use the faster encoder when it is installed
+JSONLINES_BUFFER_SIZE = 1024 * 1024
+JSONLINES_QUEUE_SIZE = 16
+JSONLINES_ENCODER = "json"
+
+# Keep every assembled item in a gzipped archive under data/archive, so the
+# records can be built again with `main.py reprocess` after a preprocessor or
+# validator changes. The whole product api payload is held in memory and
+# archived then, instead of only the fields the processors read
+RAW_ARCHIVE_ENABLED = False
+RAW_ARCHIVE_COMPRESSION_LEVEL = 6
+
+# Also write every output as parquet (requires pyarrow, poetry extra "parquet"),
+# PARQUET_ROW_GROUP_SIZE rows at a time
+PARQUET_ENABLED = False
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# Build the spreadsheet with a write-only workbook streamed from the JSONL files instead of
+# loading every file into a DataFrame
+SPREADSHEET_STREAMING = True
+
+# Response telemetry for the dashboard, records are buffered in memory and written to
+# data/dashboard every TELEMETRY_BUFFER_SIZE responses or TELEMETRY_FLUSH_INTERVAL seconds
+TELEMETRY_BUFFER_SIZE = 4096
+TELEMETRY_FLUSH_INTERVAL = 5.0
+
+# Serve live Prometheus metrics on http://127.0.0.1:METRICS_PORT while crawling,
+# rates are sampled every METRICS_INTERVAL seconds
+METRICS_ENABLED = False
+METRICS_PORT = 9410
+METRICS_INTERVAL = 5.0
+
+# Adjust the concurrency of every host between ADAPTIVE_CONCURRENCY_MIN and ADAPTIVE_CONCURRENCY_MAX.
+# It grows by one after each window of healthy responses, and is halved when the window's p90 latency
+# exceeds the host's target (seconds), when a 429 arrives, or when errors pass the maximum rate.
+# The total stays capped by CONCURRENT_REQUESTS.
+ADAPTIVE_CONCURRENCY_ENABLED = False
+ADAPTIVE_CONCURRENCY_TARGETS = {
+    "shop.adidas.jp": 1.0,
+    "adidasjp.ugc.bazaarvoice.com": 2.0,
+}
+ADAPTIVE_CONCURRENCY_TARGET_LATENCY = 1.0
+ADAPTIVE_CONCURRENCY_WINDOW = 20
+ADAPTIVE_CONCURRENCY_MAX_ERROR_RATE = 0.05
+ADAPTIVE_CONCURRENCY_MIN = 1
+ADAPTIVE_CONCURRENCY_MAX = 32
+
+# Backend reading the product page fields: "css" runs parsel css queries, "xpath" runs the same
+# selectors precompiled into lxml XPath objects (same output, see `python main.py bench-extractors`)
+PRODUCT_PAGE_EXTRACTOR = "xpath"
+
+# Worker processes running the spreadsheet, dashboard and email after a crawl
+REPORT_WORKERS = 2
+
+# SQLite file every downloaded response is recorded into, nothing is recorded when unset
+RECORD_PATH = None
+RECORD_COMMIT_EVERY = 500
+
+# Replay server the requests are sent to instead of the real hosts, set by the bench command
+REPLAY_URL = None
 
 # Set settings whose default value is deprecated to a future-proof value
 REQUEST_FINGERPRINTER_IMPLEMENTATION = "2.7"
@@ -0,0 +1,165 @@
+import json
+import shutil
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Union
+
+from adidas import columnar, settings
+from adidas.pipelines import RAW_ARCHIVE_PREFIX, AdidasPipeline
+from adidas.telemetry import latency_summary
+from adidas.utils import create_directory, scrapy_environment
+from adidas.versions import seal_version
+
+# stats that do not add up across shards
+MAX_STATS = ("elapsed_time_seconds", "finish_time", "memusage/max")
+MIN_STATS = ("start_time", "memusage/startup")
+
+
+def shard_command(shard: int, shards: int, frontier: str, limit: Union[int, None], fan_out: bool) -> List[str]:
+    command = [
+        sys.executable, "-m", "scrapy", "crawl", "products",
+        "-a", f"shard={shard}",
+        "-a", f"shards={shards}",
+        "-s", f"FRONTIER_PATH={frontier}",
+        "-s", f"METRICS_PORT={settings.METRICS_PORT + shard}",
+        "-s", "LOG_FILE=crawl.log",
+    ]  # fmt: skip
+    if limit:
+        command.extend(["-a", f"limit={limit}"])
+    if fan_out:
+        command.extend(["-a", "fan_out=true"])
+    return command
+
+
+def shard_files(shard_dirs: List[Path], pattern: str) -> List[Path]:
+    # the newest file of every shard, a crawl running past midnight has it under the day it started on
+    files = []
+    for shard_dir in shard_dirs:
+        matches = sorted(shard_dir.glob(pattern))
+        if matches:
+            files.append(matches[-1])
+    return files
+
+
+def concatenate(sources: List[Path], target: str):
+    # jsonlines, gzip members and fixed size telemetry records are all still valid when concatenated
+    with open(target, "wb") as writer:
+        for source in sources:
+            with open(source, "rb") as reader:
+                shutil.copyfileobj(reader, writer, 1024 * 1024)
+
+
+def merge_parquet(sources: List[Path], target: str):
+    writer = None
+    for source in sources:
+        parquet_file = columnar.pq.ParquetFile(source)
+        if writer is None:
+            writer = columnar.pq.ParquetWriter(target, parquet_file.schema_arrow)
+        for index in range(parquet_file.num_row_groups):
+            writer.write_table(parquet_file.read_row_group(index))
+    if writer:
+        writer.close()
+
+
+def merge_stats(shard_stats: List[dict]) -> dict:
+    merged = {}
+    for stats in shard_stats:
+        for key, value in stats.items():
+            if key not in merged:
+                merged[key] = value
+            elif key in MAX_STATS or key.endswith("/max") or "/max_" in key:
+                merged[key] = max(merged[key], value)
+            elif key in MIN_STATS or key.endswith("/min") or "/min_" in key:
+                merged[key] = min(merged[key], value)
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                merged[key] = merged[key] + value
+            elif merged[key] != value:
+                merged[key] = f"{merged[key]}, {value}"
+
+    # quantiles do not add up, they are read again from the summed histogram buckets
+    merged.update(latency_summary(merged))
+    return merged
+
+
+def merge_shards(shard_dirs: List[Path]) -> Dict[str, int]:
+    prefixes = AdidasPipeline.prefixes
+    location = create_directory("data/jsonlines", "jl", prefixes)
+    lines = {}
+    for prefix in prefixes:
+        sources = shard_files(shard_dirs, f"data/jsonlines/*/{prefix}-latest.jl")
+        concatenate(sources, f"{location}/{prefix}-latest.jl")
+        with open(f"{location}/{prefix}-latest.jl", "rb") as reader:
+            lines[prefix] = sum(1 for _ in reader)
+    seal_version(location)
+
+    archives = shard_files(shard_dirs, f"data/archive/*/{RAW_ARCHIVE_PREFIX}-latest.jl.gz")
+    if archives:
+        location = create_directory("data/archive", "jl.gz", [RAW_ARCHIVE_PREFIX])
+        concatenate(archives, f"{location}/{RAW_ARCHIVE_PREFIX}-latest.jl.gz")
+        seal_version(location)
+
+    if columnar.pq is not None and shard_files(shard_dirs, "data/parquet/*/*-latest.parquet"):
+        location = create_directory("data/parquet", "parquet", prefixes)
+        for prefix in prefixes:
+            merge_parquet(
+                shard_files(shard_dirs, f"data/parquet/*/{prefix}-latest.parquet"),
+                f"{location}/{prefix}-latest.parquet",
+            )
+        seal_version(location)
+
+    telemetry = shard_files(shard_dirs, "data/dashboard/*/latest.bin")
+    if telemetry:
+        location = create_directory("data/dashboard", "bin")
+        concatenate(telemetry, f"{location}/latest.bin")
+        seal_version(location)
+
+    shard_stats = []
+    for source in shard_files(shard_dirs, "data/stats/*/latest.json"):
+        with open(source, "r") as reader:
+            shard_stats.append(json.loads(reader.read()))
+    location = create_directory("data/stats", "json")
+    with open(f"{location}/latest.json", "w") as writer:
+        writer.write(json.dumps(merge_stats(shard_stats), indent=4))
+    seal_version(location)
+
+    location = create_directory("data/logs", "log")
+    with open(f"{location}/latest.log", "wb") as writer:
+        for shard, shard_dir in enumerate(shard_dirs):
+            writer.write(f"==> shard {shard} <==\n".encode("utf-8"))
+            if (shard_dir / "crawl.log").exists():
+                writer.write((shard_dir / "crawl.log").read_bytes())
+    seal_version(location)
+
+    return lines
+
+
+def run_shards(
+    workers: int,
+    limit: Union[int, None] = None,
+    fan_out: bool = False,
+    keep: bool = False,
+) -> Dict[str, int]:
+    Path("data/shards").mkdir(parents=True, exist_ok=True)
+    run_dir = Path(tempfile.mkdtemp(prefix="run-", dir="data/shards")).resolve()
+    frontier = str(run_dir / "frontier.sqlite")
+
+    shard_dirs = []
+    processes = []
+    for shard in range(workers):
+        shard_dir = run_dir / f"shard-{shard}"
+        shard_dir.mkdir()
+        shard_dirs.append(shard_dir)
+        command = shard_command(shard, workers, frontier, limit, fan_out)
+        processes.append(subprocess.Popen(command, cwd=shard_dir, env=scrapy_environment()))
+
+    failed = [shard for shard, process in enumerate(processes) if process.wait() != 0]
+    if failed:
+        # nothing of an incomplete run is published, the shard outputs and logs stay in the run directory
+        return {"failed_shards": failed, "run_directory": str(run_dir), "records": {}}
+
+    lines = merge_shards(shard_dirs)
+    if not keep:
+        shutil.rmtree(run_dir, ignore_errors=True)
+    return {"failed_shards": failed, "run_directory": str(run_dir), "records": lines}
@@ -1,199 +1,495 @@
+import itertools
 import json
+import math
+import time
 from datetime import datetime
 from typing import Union
-from urllib.parse import parse_qs, urlparse
 
 import scrapy
-from scrapy.selector import Selector
-from w3lib.html import remove_tags
+from scrapy import signals
+from scrapy.exceptions import DontCloseSpider
 
-from adidas.preprocessors import sanitize_size_chart_data
-from adidas.utils import create_directory
+from adidas.aggregator import ProductAggregator, assemble_item
+from adidas.cache import ModelCache
+from adidas.checkpoint import Checkpoint
+from adidas.extractors import PRODUCT_PAGE_EXTRACTORS
+from adidas.frontier import Frontier, shard_of
+from adidas.incremental import IncrementalStore
+from adidas.preprocessors import sanitize_size_chart_data, slim_api_info
+from adidas.reviews import ReviewWalk, parse_review_page
+from adidas.state import ProductState, ReviewBatch
+from adidas.telemetry import latency_summary, record_latency
+from adidas.utils import create_directory, str_to_bool
+from adidas.versions import seal_version, use_run_id
 
 
 class ProductsSpider(scrapy.Spider):
     name = "products"
     count = 0
-    queued_count = 0
+    catalogue_page_size = 120
     catalogue_url_base = "https://shop.adidas.jp/f/v1/pub/product"
     product_page_base = "https://shop.adidas.jp/products"
     product_api_base = "https://shop.adidas.jp/f/v2/web/pub/products/article"
     size_chart_url_base = "https://shop.adidas.jp/f/v1/pub/size_chart"
     reviews_url_base = "https://adidasjp.ugc.bazaarvoice.com/7896-ja_jp/<model>/reviews.djs"
 
-    def __init__(self, limit: Union[int, None] = None, *args, **kwargs):
+    def __init__(
+        self,
+        limit: Union[int, None] = None,
+        fan_out: Union[str, None] = None,
+        incremental: Union[str, None] = None,
+        shard: Union[int, None] = None,
+        shards: Union[int, None] = None,
+        resume: Union[str, None] = None,
+        *args,
+        **kwargs,
+    ):
         super().__init__(*args, **kwargs)
         self.limit = int(limit) if limit else None
+        self.fan_out = str_to_bool(fan_out)
+        self.incremental = str_to_bool(incremental)
+        # one of several crawler processes (main.py run --workers), each crawls its part of the catalogue
+        self.shard = int(shard) if shard else 0
+        self.shards = int(shards) if shards else 1
+        self.partitioned = False
+        self.resume = str_to_bool(resume)
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.aggregator = ProductAggregator(crawler.settings.getfloat("PRODUCT_JOIN_TIMEOUT", 300))
+        spider.product_page_extractor = PRODUCT_PAGE_EXTRACTORS[crawler.settings.get("PRODUCT_PAGE_EXTRACTOR", "css")]
+        spider.size_charts = ModelCache(crawler.settings.getint("MODEL_CACHE_SIZE", 1000))
+        spider.reviews = ModelCache(crawler.settings.getint("MODEL_CACHE_SIZE", 1000))
+        spider.review_walks = {}
+        spider.walk_serials = itertools.count(1)
+        frontier_path = crawler.settings.get("FRONTIER_PATH")
+        spider.frontier = Frontier(frontier_path, spider.shard) if frontier_path else None
+        spider.discovered_at = {}
+        spider.keep_api_payload = crawler.settings.getbool("RAW_ARCHIVE_ENABLED")
+        crawler.signals.connect(spider.spider_idle, signal=signals.spider_idle)
+        # articles emitted with a part missing, their fingerprints are not kept for the next incremental run
+        spider.partial = set()
+        spider.dropped = set()
+        spider.incremental_store = IncrementalStore(
+            crawler.settings.get("INCREMENTAL_STATE_PATH"),
+            crawler.settings.getlist("INCREMENTAL_IGNORED_FIELDS"),
+        )
+        spider.checkpoint = Checkpoint(
+            crawler.settings.get("CHECKPOINT_PATH"),
+            crawler.settings.getfloat("CHECKPOINT_INTERVAL", 60),
+        )
+        if spider.resume and spider.checkpoint.load():
+            # the crawl goes on with the options it was started with
+            spider.limit = spider.checkpoint.state["limit"]
+            spider.fan_out = spider.checkpoint.state["fan_out"]
+            use_run_id(spider.checkpoint.state["run_id"])
+        elif spider.resume:
+            spider.logger.warning("No checkpoint at %s, starting a new crawl", spider.checkpoint.path)
+        return spider
 
     def start_requests(self):
-        yield scrapy.Request(
-            f"{self.catalogue_url_base}/list?gender=mens&limit=120&page=1",
+        yield self.catalogue_request(1)
+
+    def catalogue_request(self, page: int, url: Union[str, None] = None):
+        # catalogue pages go ahead of product requests so the whole catalogue is known early
+        return scrapy.Request(
+            url or f"{self.catalogue_url_base}/list?gender=mens&limit={self.catalogue_page_size}&page={page}",
             callback=self.parse_links,
+            cb_kwargs={"page": page},
+            priority=10,
         )
 
-    def parse_links(self, response):
+    def parse_links(self, response, page: int = 1):
         data = response.json()
+        yield from self.next_catalogue_requests(data, page)
 
-        if "canonical_param_next" in data and not self.limit:
-            endpoint = data["canonical_param_next"].replace("item/", "list")
-            yield scrapy.Request(
-                f"{self.catalogue_url_base}/{endpoint}",
-                callback=self.parse_links,
-            )
-            self.queued_count += 120
-        elif "canonical_param_next" in data and self.queued_count < self.limit:
-            endpoint = data["canonical_param_next"].replace("item/", "list")
-            yield scrapy.Request(
-                f"{self.catalogue_url_base}/{endpoint}",
-                callback=self.parse_links,
-            )
-            self.queued_count += 120
+        articles = data["articles"].items()
+        if self.shards > 1:
+            articles = self.shard_articles(page, int(data.get("limit", self.catalogue_page_size)), articles)
 
-        for product_code, information in data["articles"].items():
+        for product_code, information in articles:
             if self.limit and self.count >= self.limit:
                 break
 
+            yield from self.article_requests(product_code, information)
+            self.count += 1
+
+    def next_catalogue_requests(self, data: dict, page: int):
+        if page == 1 and "count" in data:
+            # the first page tells the size of the catalogue, every other page is requested at once
+            wanted = min(int(data["count"]), self.limit) if self.limit else int(data["count"])
+            page_size = int(data.get("limit", self.catalogue_page_size))
+            # with shards every process reads the first page, the other pages are dealt out round robin
+            self.partitioned = True
+            for next_page in range(2, math.ceil(wanted / page_size) + 1):
+                if (next_page - 1) % self.shards == self.shard:
+                    yield self.catalogue_request(next_page)
+        elif "count" not in data and "canonical_param_next" in data:
+            if not self.limit or page * self.catalogue_page_size < self.limit:
+                endpoint = data["canonical_param_next"].replace("item/", "list")
+                yield self.catalogue_request(page + 1, f"{self.catalogue_url_base}/{endpoint}")
+
+    def article_requests(self, product_code: str, information: dict):
+        if self.checkpoint.is_restored(information["article"]):
+            # written before the crawl stopped, the pipeline kept its records
+            self.crawler.stats.inc_value("checkpoint/skipped")
+        elif self.incremental and self.incremental_store.is_unchanged(information):
+            # the records of the previous run are copied into the new version by the pipeline
+            self.incremental_store.carry(information)
+            self.crawler.stats.inc_value("incremental/unchanged")
+        elif self.fan_out:
+            self.discovered_at[information["article"]] = time.monotonic()
+            yield from self.fan_out_requests(information)
+        else:
+            self.discovered_at[information["article"]] = time.monotonic()
             yield scrapy.Request(
                 f"{self.product_page_base}/{product_code}/",
                 callback=self.parse_product_page,
                 cb_kwargs=information,
                 dont_filter=True,
             )
-            self.count += 1
 
-    def parse_product_page(self, response, **kwargs):
-        product_page_url = response.url
-        product_name = response.css("div.articleNameHeader.css-t1z1wj > h1::text").get()
-        product_categoty = response.css("div.articleNameHeader.css-t1z1wj > a > span::text").getall()
-        breadcrumb = response.css("div.breadcrumb_wrap > ul > li.breadcrumbListItem:not(.back) > a::text").getall()
-        sizes = response.css("div.test-sizeSelector > ul button::text").getall()
-        sense_of_fit = "適切" if response.css("span.test-marker").get() else None
-        title_of_description = response.css("h4.itemFeature::text").get()
-        itemization_description = []
-        for item in response.css("li.articleFeaturesItem").getall():
-            itemization_description.append(remove_tags(item))
-
-        data = {
-            "url": product_page_url,
-            "name": product_name,
-            "category": "".join(product_categoty),
-            "breadcrumb": "/".join(breadcrumb),
-            "available_sizes": sizes,
-            "sense_of_fit": sense_of_fit,
-            "title_of_description": title_of_description,
-            "itemization_description": itemization_description,
+    def shard_articles(self, page: int, page_size: int, articles):
+        owned = []
+        for position, (product_code, information) in enumerate(articles):
+            # the limit counts articles of the whole catalogue, not of the shard
+            if self.limit and (page - 1) * page_size + position >= self.limit:
+                break
+            if self.partitioned and (page - 1) % self.shards == self.shard:
+                owned.append((product_code, information))
+            elif not self.partitioned and shard_of(information["article"], self.shards) == self.shard:
+                owned.append((product_code, information))
+
+        if self.frontier:
+            # an article listed on two pages while the catalogue shifts is crawled by one shard only
+            claimed = self.frontier.claim(information["article"] for _, information in owned)
+            self.crawler.stats.inc_value("frontier/duplicates", len(owned) - len(claimed))
+            owned = [
+                (product_code, information) for product_code, information in owned if information["article"] in claimed
+            ]
+        return owned
+
+    def finished(self, item: dict) -> dict:
+        # from the catalogue entry to the finished item, every request of the product included
+        discovered_at = self.discovered_at.pop(item["product_stat"]["article"], None)
+        if discovered_at is not None:
+            record_latency(self.crawler.stats, "item", "product", time.monotonic() - discovered_at)
+        return item
+
+    def fan_out_requests(self, product_stat):
+        article = product_stat["article"]
+        parts = {
+            "product_data": (f"{self.product_page_base}/{article}/", self.join_product_page),
+            "api_info": (f"{self.product_api_base}/{article}/", self.join_product_api),
         }
+        expected = [*parts, "size_chart"]
+        if product_stat["review_count"] > 0:
+            expected.append("review_data")
+
+        state = ProductState(product_stat)
+        self.aggregator.open(product_stat, expected, state)
+        yield from self.request_size_chart(state)
+        if product_stat["review_count"] > 0:
+            yield from self.request_reviews(state)
+
+        for part, (url, callback) in parts.items():
+            yield scrapy.Request(
+                url,
+                callback=callback,
+                errback=self.join_failure,
+                cb_kwargs={"product_stat": product_stat, "state": state},
+                meta={"product_part": part},
+                dont_filter=True,
+            )
+
+    def reviews_url(self, product_stat, page: int = 1):
+        item = product_stat["article"]
+        params = f"format=embeddedhtml&productattribute_itemKcod={item}&scrollToTop=true"
+        if page > 1:
+            params = f"format=embeddedhtml&page={page}&productattribute_itemKcod={item}&scrollToTop=true"
+        return f"{self.reviews_url_base.replace('<model>', product_stat['model_code'])}?{params}"
+
+    def join(self, product_stat, part, value):
+        if product_stat["article"] not in self.aggregator.pending:
+            self.crawler.stats.inc_value("aggregator/late_parts")
+
+        entry = self.aggregator.add(product_stat["article"], part, value)
+        entries = self.aggregator.expire()
+        if entry:
+            entries.append(entry)
+        yield from self.assemble(entries)
+
+    def assemble(self, entries):
+        for entry in entries:
+            item = assemble_item(entry)
+            article = entry["item"]["product_stat"]["article"]
+            if item is None:
+                # reviews without the product records they belong to are not written
+                self.crawler.stats.inc_value("aggregator/dropped")
+                self.logger.warning("Dropped %s, missing %s", article, entry["failed"])
+                self.dropped.add(article)
+                entry["state"].review_batches = []
+                continue
+
+            if entry["failed"]:
+                self.crawler.stats.inc_value("aggregator/partial")
+                self.partial.add(article)
+            yield self.finished(item)
+
+            # review batches that came in first are named now
+            state = entry["state"]
+            for batch in state.review_batches:
+                batch.product_name = item["product_data"]["name"]
+                yield batch
+            state.review_batches = None
+
+    def spider_idle(self):
+        # nothing is in flight, the parts still missing are never coming (a callback that raised does not reach
+        # the errback), the products are emitted with what they have from a request that needs no network
+        if self.fan_out and len(self.aggregator):
+            self.crawler.engine.crawl(scrapy.Request("data:,", callback=self.flush_aggregator, dont_filter=True))
+            raise DontCloseSpider
+
+    def flush_aggregator(self, response):
+        self.crawler.stats.inc_value("aggregator/flushed", len(self.aggregator))
+        yield from self.assemble(self.aggregator.expire(everything=True))
+
+    def join_failure(self, failure):
+        request = failure.request
+        part = request.meta["product_part"]
+        self.crawler.stats.inc_value(f"aggregator/failed/{part}")
+        yield from self.join(request.cb_kwargs["product_stat"], part, None)
+
+    def join_product_page(self, response, product_stat, state):
+        state.product_data = self.extract_product_page(response)
+        yield from self.join(product_stat, "product_data", state.product_data)
+
+    def join_product_api(self, response, product_stat, state):
+        yield from self.join(product_stat, "api_info", self.api_info(response))
+
+    def parse_product_page(self, response, **kwargs):
+        data = self.extract_product_page(response)
 
         yield scrapy.Request(
             f"{self.product_api_base}/{kwargs['article']}/",
             callback=self.parse_product_api,
-            cb_kwargs={"product_stat": kwargs, "product_data": data},
+            cb_kwargs={"state": ProductState(kwargs, data)},
             dont_filter=True,
         )
 
-    def parse_product_api(self, response, **kwargs):
+    def api_info(self, response):
+        # the archive keeps the whole payload, so main.py reprocess can read fields the processors do not use yet
         data = response.json()
-        yield scrapy.Request(
-            f"{self.size_chart_url_base}/{kwargs['product_stat']['model_code']}/",
-            callback=self.parse_size_charts,
-            cb_kwargs={**kwargs, "api_info": data},
-            dont_filter=True,
-        )
+        return data if self.keep_api_payload else slim_api_info(data)
+
+    def extract_product_page(self, response):
+        return {"url": response.url, **self.product_page_extractor(response)}
+
+    def parse_product_api(self, response, state):
+        state.api_info = self.api_info(response)
+        yield from self.request_size_chart(state)
+
+    def request_size_chart(self, waiter):
+        # size charts are shared by every article of a model, so they are downloaded once per model_code
+        model_code = waiter.product_stat["model_code"]
+        if model_code in self.size_charts:
+            self.crawler.stats.inc_value("cache/size_chart/hit")
+            yield from self.with_size_chart(waiter, self.size_charts.get(model_code))
+        elif self.size_charts.subscribe(model_code, waiter):
+            self.crawler.stats.inc_value("cache/size_chart/miss")
+            yield scrapy.Request(
+                f"{self.size_chart_url_base}/{model_code}/",
+                callback=self.parse_size_charts,
+                errback=self.size_chart_failure,
+                cb_kwargs={"model_code": model_code},
+                dont_filter=True,
+            )
+        else:
+            self.crawler.stats.inc_value("cache/size_chart/coalesced")
 
-    def parse_size_charts(self, response, **kwargs):
+    def parse_size_charts(self, response, model_code):
         data = response.json()
         data = sanitize_size_chart_data(data) if data["size_chart"] else []
 
-        if kwargs["product_stat"]["review_count"] > 0:
-            item = kwargs["product_stat"]["article"]
-            model_code = kwargs["product_stat"]["model_code"]
-            params = f"format=embeddedhtml&productattribute_itemKcod={item}&scrollToTop=true"
+        for waiter in self.size_charts.resolve(model_code, data):
+            yield from self.with_size_chart(waiter, data)
+
+    def size_chart_failure(self, failure):
+        self.crawler.stats.inc_value("cache/size_chart/failed")
+        for waiter in self.size_charts.resolve(failure.request.cb_kwargs["model_code"], None):
+            yield from self.with_size_chart(waiter, None)
+
+    def with_size_chart(self, waiter, size_chart):
+        if size_chart is None:
+            self.partial.add(waiter.product_stat["article"])
+
+        if self.fan_out:
+            yield from self.join(waiter.product_stat, "size_chart", size_chart)
+        elif waiter.product_stat["review_count"] > 0:
+            waiter.size_chart = size_chart
+            yield from self.request_reviews(waiter)
+        else:
+            waiter.size_chart = size_chart
+            yield self.finished(waiter.as_item())
+
+    def request_reviews(self, waiter):
+        # reviews are walked once per model_code and handed to every article waiting on it,
+        # incremental runs only walk them down to the last review known for the article
+        watermark = self.incremental_store.watermark(waiter.product_stat) if self.incremental else None
+        key = self.review_key(waiter.product_stat, watermark)
+        if key in self.reviews:
+            self.crawler.stats.inc_value("cache/reviews/hit")
+            cached = self.reviews.get(key)
+            yield from self.with_review_data(waiter, cached["head"])
+            yield from self.review_batch(waiter, cached["reviews"], last=True, incremental=cached["incremental"])
+        elif key in self.review_walks:
+            # the pages already handed out are gone, the article waits for the walk to finish
+            self.crawler.stats.inc_value("cache/reviews/late")
+            self.review_walks[key].late.append(waiter)
+        elif self.reviews.subscribe(key, waiter):
+            self.crawler.stats.inc_value("cache/reviews/miss")
             yield scrapy.Request(
-                f"{self.reviews_url_base.replace('<model>', model_code)}?{params}",
+                self.reviews_url(waiter.product_stat),
                 callback=self.parse_reviews,
-                cb_kwargs={**kwargs, "size_chart": data},
+                errback=self.reviews_failure,
+                cb_kwargs={"product_stat": waiter.product_stat, "watermark": watermark},
                 dont_filter=True,
             )
         else:
-            yield {**kwargs, "size_chart": data, "review_data": {}}
-
-    def parse_reviews(self, response, **kwargs):
-        review_data = {} if "review_data" not in kwargs else kwargs["review_data"]
-        reviews = [] if "reviews" not in review_data else review_data["reviews"]
-
-        for line in response.body.decode().split("\n"):
-            if line.startswith("var materials="):
-                review_info = json.loads(line.replace("var materials=", "")[:-1])
-                review_html = Selector(text=review_info["BVRRSourceID"].replace("\\", ""), type="html")
-
-        total_page = kwargs["product_stat"]["review_count"] // 10 + 1
-        parsed_url = urlparse(response.url)
-        query_params = parse_qs(parsed_url.query)
-        next_page = int(query_params.get("page", ["1"])[0]) + 1
-
-        if next_page == 2:
-            rating = review_html.css(
-                "#BVRRRatingOverall_ > div.BVRRRatingNormalOutOf > span.BVRRNumber.BVRRRatingNumber::text"
-            ).get()
-            number_of_reviews = review_html.css("span.BVRRNumber.BVRRBuyAgainTotal::text").get()
-            recommended_rate = review_html.css("span.BVRRBuyAgainPercentage > span.BVRRNumber::text").get()
-            sense_of_fit_rate = review_html.css(
-                "div.BVRRSecondaryRatingsContainer div.BVRRRatingFit img::attr(title)"
-            ).get()
-            appropriation_of_length_rate = review_html.css(
-                "div.BVRRSecondaryRatingsContainer div.BVRRRatingLength img::attr(title)"
-            ).get()
-            material_quality_rate = review_html.css(
-                "div.BVRRSecondaryRatingsContainer div.BVRRRatingQuality img::attr(title)"
-            ).get()
-            comfort_rate = review_html.css(
-                "div.BVRRSecondaryRatingsContainer div.BVRRRatingComfort img::attr(title)"
-            ).get()
-
-            review_data = {
-                "rating": rating,
-                "number_of_reviews": number_of_reviews,
-                "recommended_rate": recommended_rate,
-                "sense_of_fit_rate": sense_of_fit_rate,
-                "appropriation_of_length_rate": appropriation_of_length_rate,
-                "material_quality_rate": material_quality_rate,
-                "comfort_rate": comfort_rate,
-            }
-
-        for review_section in review_html.css("#BVSubmissionPopupContainer"):
-            review_date = review_section.css("span.BVRRReviewDate::text").get()
-            review_rating = review_section.css(
-                "#BVRRRatingOverall_Review_Display > div.BVRRRatingNormalImage > img::attr(title)"
-            ).get()
-            review_title = review_section.css("span.BVRRReviewTitle::text").get()
-            review_description = review_section.css("span.BVRRReviewText::text").get()
-            reviewer_id = review_section.css("span.BVRRNickname::text").get()
-            reviews.append(
-                {
-                    "review_date": review_date,
-                    "review_rating": review_rating,
-                    "review_title": review_title,
-                    "review_description": review_description,
-                    "reviewer_id": reviewer_id,
-                }
+            self.crawler.stats.inc_value("cache/reviews/coalesced")
+
+    def review_key(self, product_stat, watermark):
+        return product_stat["model_code"], watermark["key"] if watermark else None
+
+    def current_walk(self, key, walk_serial) -> Union[ReviewWalk, None]:
+        # pages of a walk that already finished are not added to a later walk of the same model
+        walk = self.review_walks.get(key)
+        if walk is None or walk.serial != walk_serial:
+            self.crawler.stats.inc_value("incremental/late_review_pages")
+            return None
+        return walk
+
+    def reviews_failure(self, failure):
+        self.crawler.stats.inc_value("cache/reviews/failed")
+        kwargs = failure.request.cb_kwargs
+        key = self.review_key(kwargs["product_stat"], kwargs["watermark"])
+
+        if kwargs.get("page", 1) == 1:
+            for waiter in self.reviews.resolve(key, None):
+                yield from self.with_review_data(waiter, None)
+        elif self.current_walk(key, kwargs["walk_serial"]):
+            self.review_walks[key].add(kwargs["page"], [], failed=True)
+            yield from self.continue_review_walk(kwargs["product_stat"], kwargs["watermark"])
+
+    def with_review_data(self, waiter, review_data):
+        if review_data is None:
+            self.partial.add(waiter.product_stat["article"])
+
+        if self.fan_out:
+            yield from self.join(waiter.product_stat, "review_data", review_data)
+        else:
+            waiter.review_data = review_data
+            yield self.finished(waiter.as_item())
+
+    def review_batch(self, waiter, reviews, last=False, incremental=False):
+        batch = ReviewBatch(
+            waiter.product_stat["article"],
+            waiter.product_stat["model_code"],
+            None,
+            reviews,
+            last,
+            incremental,
+        )
+        if waiter.review_batches is not None:
+            # fan-out, the batch is held until the product item is out, and discarded with a dropped product
+            if waiter.product_stat["article"] not in self.dropped:
+                waiter.review_batches.append(batch)
+            return
+
+        batch.product_name = waiter.product_data["name"]
+        yield batch
+
+    def parse_reviews(self, response, product_stat, watermark, page=1, walk_serial=None):
+        key = self.review_key(product_stat, watermark)
+        if page > 1 and not self.current_walk(key, walk_serial):
+            # the walk already stopped at the last known review
+            return
+
+        summary, reviews = parse_review_page(response.body, summary=page == 1)
+
+        if page == 1:
+            total_page = product_stat["review_count"] // 10 + 1
+            known_count = watermark["review_count"] if watermark else 0
+            walk = ReviewWalk(
+                total_page,
+                self.settings.getint("REVIEW_PAGE_CONCURRENCY", 4),
+                watermark,
+                max(product_stat["review_count"] - known_count, 0) // 10 + 1 if watermark else None,
+                serial=next(self.walk_serials),
+                retain_limit=self.settings.getint("REVIEW_CACHE_MAX_REVIEWS", 500),
             )
+            self.review_walks[key] = walk
+            walk.summary = summary
+            walk.add(page, reviews)
 
-        review_data["reviews"] = reviews
-        if next_page <= total_page:
-            item = kwargs["product_stat"]["article"]
-            model_code = kwargs["product_stat"]["model_code"]
-            params = f"format=embeddedhtml&page={next_page}&productattribute_itemKcod={item}&scrollToTop=true"
+            # the product records go out with the summary, the reviews follow page by page
+            walk.head_data = walk.head()
+            walk.recipients = self.reviews.resolve(key, None)
+            for waiter in walk.recipients:
+                yield from self.with_review_data(waiter, walk.head_data)
+        else:
+            self.review_walks[key].add(page, reviews)
+
+        yield from self.continue_review_walk(product_stat, watermark)
+
+    def continue_review_walk(self, product_stat, watermark):
+        # page 1 tells the number of pages, the rest are fetched concurrently and released in page order
+        key = self.review_key(product_stat, watermark)
+        walk = self.review_walks[key]
 
+        for page in walk.schedule():
             yield scrapy.Request(
-                f"{self.reviews_url_base.replace('<model>', model_code)}?{params}",
+                self.reviews_url(product_stat, page),
                 callback=self.parse_reviews,
-                cb_kwargs={**kwargs, "review_data": review_data},
+                errback=self.reviews_failure,
+                cb_kwargs={
+                    "product_stat": product_stat,
+                    "watermark": watermark,
+                    "page": page,
+                    "walk_serial": walk.serial,
+                },
                 dont_filter=True,
             )
-        else:
-            yield {**kwargs, "review_data": review_data}
+
+        reviews = walk.release()
+        if walk.complete:
+            del self.review_walks[key]
+            for waiter in walk.recipients:
+                if walk.failed:
+                    # the watermark of page 1 would stop the next incremental walk above the missing pages
+                    self.partial.add(waiter.product_stat["article"])
+                yield from self.review_batch(waiter, reviews, last=True, incremental=walk.cut_page is not None)
+
+            cached = walk.cached_data()
+            if cached:
+                self.reviews.resolve(key, cached)
+            for waiter in walk.late:
+                yield from self.request_reviews(waiter)
+        elif reviews:
+            for waiter in walk.recipients:
+                yield from self.review_batch(waiter, reviews)
 
     def closed(self, reason):
+        if self.frontier:
+            self.frontier.close()
+
+        if self.fan_out:
+            self.crawler.stats.set_value("aggregator/unfinished", len(self.aggregator))
+
+        for key, value in latency_summary(self.crawler.stats.get_stats()).items():
+            self.crawler.stats.set_value(key, value)
+
         location = create_directory("data/stats", "json")
         stats = self.crawler.stats.get_stats()
 
@@ -203,3 +499,4 @@ class ProductsSpider(scrapy.Spider):
 
         with open(f"{location}/latest.json", "w") as writer:
             writer.write(json.dumps(stats, indent=4))
+        seal_version(location)
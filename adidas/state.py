@@ -0,0 +1,36 @@
+from dataclasses import dataclass
+from typing import List, Union
+
+
+class ProductState:
+    # what a product carries from one request of the serial chain to the next, updated in place at every hop
+    __slots__ = ("product_stat", "product_data", "api_info", "size_chart", "review_data", "review_batches")
+
+    def __init__(self, product_stat: dict, product_data: Union[dict, None] = None, api_info: Union[dict, None] = None):
+        self.product_stat = product_stat
+        self.product_data = product_data
+        self.api_info = api_info
+        self.size_chart = None
+        self.review_data = None
+        # review batches held until the product item is out (fan-out only), None once they pass straight through
+        self.review_batches = [] if product_data is None else None
+
+    def as_item(self) -> dict:
+        return {
+            "product_stat": self.product_stat,
+            "product_data": self.product_data,
+            "api_info": self.api_info,
+            "size_chart": self.size_chart or [],
+            "review_data": self.review_data or {},
+        }
+
+
+@dataclass
+class ReviewBatch:
+    # the reviews of one or more pages for one article, written by the pipeline as soon as they arrive
+    product_id: str
+    model_code: str
+    product_name: Union[str, None]
+    reviews: List[dict]
+    last: bool = False
+    incremental: bool = False
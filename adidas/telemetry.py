@@ -0,0 +1,163 @@
+import math
+import struct
+import time
+from enum import IntEnum
+from typing import Dict, List, Union
+
+import numpy as np
+
+
+class Endpoint(IntEnum):
+    OTHER = 0
+    CATALOGUE = 1
+    PRODUCT_PAGE = 2
+    PRODUCT_API = 3
+    SIZE_CHART = 4
+    REVIEWS = 5
+
+
+# checked in order, the product api path also contains "/products/"
+ENDPOINT_PATTERNS = (
+    ("bazaarvoice.com", Endpoint.REVIEWS),
+    ("/f/v1/pub/product/list", Endpoint.CATALOGUE),
+    ("/f/v2/web/pub/products/article", Endpoint.PRODUCT_API),
+    ("/f/v1/pub/size_chart", Endpoint.SIZE_CHART),
+    ("/products/", Endpoint.PRODUCT_PAGE),
+)
+
+# sent_at, received_at (unix seconds), response_size, status, endpoint
+TELEMETRY_RECORD = struct.Struct("<ddIHB")
+TELEMETRY_DTYPE = np.dtype(
+    [
+        ("sent_at", "<f8"),
+        ("received_at", "<f8"),
+        ("response_size", "<u4"),
+        ("status", "<u2"),
+        ("endpoint", "u1"),
+    ]
+)
+
+
+def classify_endpoint(url: str) -> Endpoint:
+    for pattern, endpoint in ENDPOINT_PATTERNS:
+        if pattern in url:
+            return endpoint
+    return Endpoint.OTHER
+
+
+class TelemetrySink:
+    def __init__(self, path: str, capacity: int, flush_interval: float):
+        # one handle for the whole crawl, records are packed into a fixed buffer that is reused after each flush
+        self.file = open(path, "ab")
+        # a record cut off when a stopped crawl is resumed would shift every record after it
+        self.file.truncate(self.file.tell() - self.file.tell() % TELEMETRY_RECORD.size)
+        self.buffer = bytearray(TELEMETRY_RECORD.size * capacity)
+        self.capacity = capacity
+        self.size = 0
+        self.flush_interval = flush_interval
+        self.flushed_at = time.monotonic()
+
+    def record(self, sent_at: float, received_at: float, response_size: int, status: int, endpoint: Endpoint):
+        TELEMETRY_RECORD.pack_into(
+            self.buffer,
+            self.size * TELEMETRY_RECORD.size,
+            sent_at,
+            received_at,
+            response_size,
+            status,
+            endpoint,
+        )
+        self.size += 1
+
+        if self.size == self.capacity or time.monotonic() - self.flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        self.file.write(memoryview(self.buffer)[: self.size * TELEMETRY_RECORD.size])
+        self.file.flush()
+        self.size = 0
+        self.flushed_at = time.monotonic()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_telemetry(path: str) -> np.ndarray:
+    return np.fromfile(path, dtype=TELEMETRY_DTYPE)
+
+
+# latency buckets grow by 2 ** (1 / LATENCY_BUCKETS_PER_DOUBLING) from 1ms, so a quantile is off by at most ~19%
+LATENCY_BASE = 0.001
+LATENCY_BUCKETS_PER_DOUBLING = 4
+LATENCY_QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+def latency_bucket(seconds: float) -> int:
+    if seconds <= LATENCY_BASE:
+        return 0
+    return math.ceil(LATENCY_BUCKETS_PER_DOUBLING * math.log2(seconds / LATENCY_BASE))
+
+
+def bucket_upper_bound(bucket: int) -> float:
+    return LATENCY_BASE * 2 ** (bucket / LATENCY_BUCKETS_PER_DOUBLING)
+
+
+def record_latency(stats, stage: str, endpoint: Union[Endpoint, str], seconds: float):
+    # plain stats counters, histograms of several crawls merge by adding them up
+    name = endpoint.name.lower() if isinstance(endpoint, Endpoint) else endpoint
+    prefix = f"latency/{stage}/{name}"
+    stats.inc_value(f"{prefix}/bucket/{latency_bucket(seconds)}")
+    stats.max_value(f"{prefix}/max", seconds)
+    stats.inc_value(f"{prefix}/sum", seconds)
+
+
+class LatencyHistogram:
+    def __init__(self, counts: Union[Dict[int, int], None] = None, maximum: float = 0.0):
+        self.counts = dict(counts or {})
+        self.maximum = maximum
+
+    @classmethod
+    def from_stats(cls, stats: dict, prefix: str):
+        histogram = cls()
+        for key, value in stats.items():
+            if key.startswith(f"{prefix}/bucket/"):
+                histogram.counts[int(key.rsplit("/", 1)[1])] = value
+        histogram.maximum = stats.get(f"{prefix}/max", 0.0)
+        return histogram
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def merge(self, other: "LatencyHistogram"):
+        for bucket, count in other.counts.items():
+            self.counts[bucket] = self.counts.get(bucket, 0) + count
+        self.maximum = max(self.maximum, other.maximum)
+
+    def quantile(self, q: float) -> float:
+        rank = q * len(self)
+        seen = 0
+        for bucket in sorted(self.counts):
+            seen += self.counts[bucket]
+            if seen >= rank:
+                return min(bucket_upper_bound(bucket), self.maximum)
+        return self.maximum
+
+    def summary(self) -> Dict[str, float]:
+        summary = {name: round(self.quantile(q), 4) for name, q in LATENCY_QUANTILES.items()}
+        summary["max"] = round(self.maximum, 4)
+        summary["count"] = len(self)
+        return summary
+
+
+def latency_prefixes(stats: dict) -> List[str]:
+    # latency/<stage>/<endpoint> of every recorded histogram
+    return sorted({key.rsplit("/bucket/", 1)[0] for key in stats if key.startswith("latency/") and "/bucket/" in key})
+
+
+def latency_summary(stats: dict) -> Dict[str, float]:
+    summary = {}
+    for prefix in latency_prefixes(stats):
+        for name, value in LatencyHistogram.from_stats(stats, prefix).summary().items():
+            summary[f"{prefix}/{name}"] = value
+    return summary
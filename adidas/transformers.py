@@ -1,11 +1,17 @@
-from datetime import datetime
+import json
+from numbers import Number
+from pathlib import Path
+from typing import Union
 
 import pandas as pd
 import pydash
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
 from openpyxl.styles import Alignment, Border, Font, Side
 from openpyxl.utils import get_column_letter
 
-from adidas.utils import create_directory
+from adidas.utils import create_directory, versioned_file
+from adidas.versions import seal_version
 
 
 def hyperlink_columns(name):
@@ -54,8 +60,17 @@ def column_width_definitions(name):
     return data[name]
 
 
-def format_sheet_views(writer, sheet_name, number_of_columns, name):
+def column_width(name, col):
     column_widths = column_width_definitions(name)
+    if col == 1:
+        return 2.71
+    if name == "product-sizes":
+        # every measurement column after the product name shares one width
+        return column_widths[min(col - 2, 2)]
+    return column_widths[col - 2]
+
+
+def format_sheet_views(writer, sheet_name, number_of_columns, name):
     hyperlinks = hyperlink_columns(name)
 
     worksheet = writer.sheets[sheet_name]
@@ -63,18 +78,7 @@ def format_sheet_views(writer, sheet_name, number_of_columns, name):
 
     for col in range(1, number_of_columns + 2):
         column_letter = get_column_letter(col)
-        column_dimensions = worksheet.column_dimensions[column_letter]
-        if sheet_name != "Sizes":
-            column_dimensions.width = column_widths[col - 2] if col > 1 else 2.71
-        else:
-            if col == 1:
-                column_dimensions.width = 2.71
-            elif col == 2:
-                column_dimensions.width = column_widths[0]
-            elif col == 3:
-                column_dimensions.width = column_widths[1]
-            else:
-                column_dimensions.width = column_widths[2]
+        worksheet.column_dimensions[column_letter].width = column_width(name, col)
 
         for cell in worksheet[column_letter]:
             if cell.row != 1:
@@ -121,12 +125,8 @@ def create_contents_table_data(sheets):
     return pd.DataFrame(data)
 
 
-def generate_product_spreadsheet():
-    destination = create_directory("data/spreadsheets", "xlsx")
-    current_date = datetime.now().date().isoformat()
-    writer = pd.ExcelWriter(f"{destination}/latest.xlsx", engine="openpyxl")
-
-    sheets = {
+def spreadsheet_sheets():
+    return {
         "table-of-contents": "Table of Contents",
         "product-information": "Product Information",
         "product-media": "Product Media",
@@ -136,8 +136,142 @@ def generate_product_spreadsheet():
         "product-reviews": "Reviews",
     }
 
+
+def is_number(value):
+    if isinstance(value, bool):
+        return False
+    if isinstance(value, Number):
+        return True
+    try:
+        float(value)
+    except (TypeError, ValueError):
+        return False
+    return True
+
+
+def read_column_types(source):
+    # first pass over a file, columns in the order pandas would build them and the ones read_json makes numeric
+    columns = {}
+    rows = 0
+    with open(source, "r", encoding="utf-8") as reader:
+        for line in reader:
+            rows += 1
+            for key, value in json.loads(line).items():
+                column = columns.setdefault(key, {"count": 0, "numeric": True, "integral": True})
+                if value is None:
+                    continue
+
+                column["count"] += 1
+                if column["numeric"] and not is_number(value):
+                    column["numeric"] = column["integral"] = False
+                elif column["integral"] and column["numeric"] and not float(value).is_integer():
+                    column["integral"] = False
+
+    types = {}
+    for key, column in columns.items():
+        if not column["numeric"] or not column["count"]:
+            types[key] = None
+        elif column["integral"] and column["count"] == rows:
+            types[key] = int
+        else:
+            types[key] = float
+    return types
+
+
+def convert_cell_value(value, kind):
+    if value is None or kind is None:
+        return str(value) if isinstance(value, (list, dict)) else value
+    return kind(float(value))
+
+
+def stream_rows(source, types):
+    with open(source, "r", encoding="utf-8") as reader:
+        for line in reader:
+            record = json.loads(line)
+            yield [convert_cell_value(record.get(key), kind) for key, kind in types.items()]
+
+
+def write_streaming_sheet(workbook, sheet_name, name, columns, rows):
+    worksheet = workbook.create_sheet(sheet_name)
+    hyperlinks = hyperlink_columns(name)
+    worksheet.freeze_panes = "A4"
+    for col in range(1, len(columns) + 2):
+        worksheet.column_dimensions[get_column_letter(col)].width = column_width(name, col)
+
+    # styles are created once and shared by every cell of the sheet
+    alignment = Alignment(wrap_text=True, vertical="top")
+    link_font = Font(underline="single", color="0563C1")
+    header_font = Font(color="002060", size=12, bold=True)
+    header_border = Border(bottom=Side(border_style="medium", color="002060"))
+
+    def styled_cell(value=None, **styles):
+        cell = WriteOnlyCell(worksheet, value=value)
+        cell.alignment = alignment
+        for key, style in styles.items():
+            setattr(cell, key, style)
+        return cell
+
+    title = WriteOnlyCell(worksheet, value=f"{sheet_name} Table")
+    title.font = Font(color="002060", size=14, bold=True)
+    worksheet.append([None, title])
+    worksheet.append([styled_cell() for _ in range(len(columns) + 1)])
+
+    headers = [
+        styled_cell(pydash.human_case(column).title(), font=header_font, border=header_border) for column in columns
+    ]
+    worksheet.append([styled_cell(), *headers])
+
+    for row in rows:
+        cells = [styled_cell()]
+        for index, value in enumerate(row):
+            if index not in hyperlinks:
+                cells.append(styled_cell(value))
+            elif name == "table-of-contents":
+                cells.append(styled_cell(f'=HYPERLINK("#\'{value}\'!A1", "{value}")', font=link_font))
+            else:
+                cell = styled_cell(value, font=link_font)
+                cell.hyperlink = value
+                cells.append(cell)
+        worksheet.append(cells)
+
+
+def stream_product_spreadsheet(date: Union[str, None] = None, version: Union[int, None] = None):
+    # write-only workbook, rows go to disk as they are appended so memory stays at one row
+    destination = create_directory("data/spreadsheets", "xlsx", date=date)
+    workbook = Workbook(write_only=True)
+    sheets = spreadsheet_sheets()
+
+    for filename, sheet_name in sheets.items():
+        if filename == "table-of-contents":
+            contents = create_contents_table_data(sheets)
+            columns, rows = list(contents.columns), contents.itertuples(index=False)
+        else:
+            source = versioned_file("data/jsonlines", "jl", date, version, prefix=filename)
+            types = read_column_types(source)
+            columns, rows = list(types), stream_rows(source, types)
+
+        write_streaming_sheet(workbook, sheet_name, filename, columns, rows)
+
+    workbook.save(f"{destination}/latest.xlsx")
+    seal_version(destination)
+
+
+def generate_product_spreadsheet(streaming=False, date: Union[str, None] = None, version: Union[int, None] = None):
+    sources = [versioned_file("data/jsonlines", "jl", date, version, prefix=name) for name in spreadsheet_sheets()]
+    missing = [source for source in sources[1:] if not Path(source).exists()]
+    if missing:
+        # checked before create_directory moves the current spreadsheet aside
+        raise FileNotFoundError(f"Missing source files: {', '.join(missing)}")
+
+    if streaming:
+        return stream_product_spreadsheet(date, version)
+
+    destination = create_directory("data/spreadsheets", "xlsx", date=date)
+    writer = pd.ExcelWriter(f"{destination}/latest.xlsx", engine="openpyxl")
+    sheets = spreadsheet_sheets()
+
     for filename, sheet_name in sheets.items():
-        source = f"data/jsonlines/{current_date}/{filename}-latest.jl"
+        source = versioned_file("data/jsonlines", "jl", date, version, prefix=filename)
         if filename == "table-of-contents":
             df = create_contents_table_data(sheets)
         else:
@@ -151,3 +285,4 @@ def generate_product_spreadsheet():
         format_sheet_views(writer, sheet_name, len(df.columns), filename)
 
     writer.close()
+    seal_version(destination)
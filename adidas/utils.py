@@ -1,29 +1,35 @@
-from datetime import datetime
+import os
 from pathlib import Path
 from typing import List, Union
 
+from adidas.versions import allocate_version, resolve_version
 
-def rename_versions(location: str, version: int, ext: str, prefix: Union[str, None] = None):
-    old_filename = f"{prefix}-latest" if prefix else "latest"
-    current_latest_version = Path(f"{location}/{old_filename}.{ext}")
-    new_filename = f"{prefix}-version-{version}" if prefix else f"version-{version}"
-    renamed_file = Path(f"{location}/{new_filename}.{ext}")
-    current_latest_version.rename(renamed_file)
 
+def str_to_bool(value: Union[str, bool, None]) -> bool:
+    return str(value).lower() in ("1", "true", "yes") if value else False
 
-def create_directory(root: str, ext: str, prefixes: Union[List[str], None] = None):
-    current_date = datetime.now().date().isoformat()
-    location = f"{root}/{current_date}"
-    Path(location).mkdir(parents=True, exist_ok=True)
 
-    divider = len(prefixes) if prefixes else 1
-    version = len([file for file in Path(location).glob("*") if file.is_file()]) // divider
+def versioned_file(
+    root: str,
+    ext: str,
+    date: Union[str, None] = None,
+    version: Union[int, None] = None,
+    prefix: Union[str, None] = None,
+) -> str:
+    # looked up in the manifest of the day, "latest" when no version is given
+    return resolve_version(root, ext, date, version, prefix)
 
-    if version:
-        if prefixes:
-            for prefix in prefixes:
-                rename_versions(location, version, ext, prefix)
-        else:
-            rename_versions(location, version, ext)
 
+def create_directory(root: str, ext: str, prefixes: Union[List[str], None] = None, date: Union[str, None] = None):
+    location, _ = allocate_version(root, ext, prefixes, date)
     return location
+
+
+def scrapy_environment() -> dict:
+    # lets `python -m scrapy crawl` run from any working directory
+    project = str(Path(__file__).resolve().parent.parent)
+    return {
+        **os.environ,
+        "SCRAPY_SETTINGS_MODULE": os.environ.get("SCRAPY_SETTINGS_MODULE", "adidas.settings"),
+        "PYTHONPATH": os.pathsep.join(filter(None, [project, os.environ.get("PYTHONPATH")])),
+    }
@@ -0,0 +1,212 @@
+import gzip
+import hashlib
+import json
+import os
+import re
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Tuple, Union
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+MANIFEST = "manifest.json"
+
+# one id for every version written by a run, main.py passes it on to the crawl and the report workers
+RUN_ID = os.environ.setdefault("LAZULI_RUN_ID", uuid.uuid4().hex)
+
+
+def use_run_id(run_id: str):
+    # a resumed crawl writes its versions under the id of the run it continues
+    global RUN_ID
+    RUN_ID = os.environ["LAZULI_RUN_ID"] = run_id
+
+
+def file_name(ext: str, prefix: Union[str, None], version: Union[int, None] = None) -> str:
+    filename = f"version-{version}" if version else "latest"
+    return f"{prefix}-{filename}.{ext}" if prefix else f"{filename}.{ext}"
+
+
+@contextmanager
+def locked(location: str):
+    # runs started at the same time take versions one after another
+    with open(f"{location}/.manifest.lock", "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def discover(location: str, ext: str) -> dict:
+    # directories written before the manifest existed, the versions are read from the file names once
+    pattern = re.compile(rf"^(?:(.+)-)?(?:latest|version-(\d+))\.{re.escape(ext)}$")
+    found = {}
+    for path in Path(location).glob(f"*.{ext}"):
+        match = pattern.match(path.name)
+        if match:
+            prefix, number = match.groups()
+            found.setdefault(int(number) if number else None, {})[prefix or ""] = {"path": path.name}
+
+    latest = None
+    if None in found:
+        latest = max(filter(None, found), default=0) + 1
+        found[latest] = found.pop(None)
+
+    versions = {
+        str(number): {"run_id": None, "created_at": None, "status": "sealed", "files": found[number]}
+        for number in sorted(found)
+    }
+    return {"ext": ext, "latest": latest, "versions": versions}
+
+
+def read_manifest(location: str, ext: str) -> dict:
+    path = Path(f"{location}/{MANIFEST}")
+    if not path.exists():
+        return discover(location, ext)
+
+    with open(path, "r", encoding="utf-8") as reader:
+        return json.loads(reader.read())
+
+
+def write_manifest(location: str, manifest: dict):
+    path = f"{location}/{MANIFEST}"
+    with open(f"{path}.tmp", "w", encoding="utf-8") as writer:
+        writer.write(json.dumps(manifest, indent=4))
+    os.replace(f"{path}.tmp", path)
+
+
+def allocate_version(
+    root: str,
+    ext: str,
+    prefixes: Union[List[str], None] = None,
+    date: Union[str, None] = None,
+    run_id: Union[str, None] = None,
+) -> Tuple[str, int]:
+    # the new version is written to the -latest files, the files of the version before are renamed after its number
+    location = f"{root}/{date or datetime.now().date().isoformat()}"
+    Path(location).mkdir(parents=True, exist_ok=True)
+
+    with locked(location):
+        manifest = read_manifest(location, ext)
+        previous = manifest["latest"]
+        if previous:
+            for key, file in manifest["versions"][str(previous)]["files"].items():
+                renamed = file_name(ext, key or None, previous)
+                if Path(f"{location}/{file['path']}").exists():
+                    Path(f"{location}/{file['path']}").rename(f"{location}/{renamed}")
+                file["path"] = renamed
+
+        version = max(map(int, manifest["versions"]), default=0) + 1
+        manifest["latest"] = version
+        manifest["versions"][str(version)] = {
+            "run_id": run_id or RUN_ID,
+            "created_at": datetime.now().isoformat(),
+            "status": "open",
+            "files": {key or "": {"path": file_name(ext, key)} for key in prefixes or [None]},
+        }
+        write_manifest(location, manifest)
+    return location, version
+
+
+def describe(path: Path, ext: str) -> dict:
+    digest = hashlib.sha256()
+    with open(path, "rb") as reader:
+        for chunk in iter(lambda: reader.read(1024 * 1024), b""):
+            digest.update(chunk)
+
+    rows = None
+    if ext == "jl":
+        with open(path, "rb") as reader:
+            rows = sum(chunk.count(b"\n") for chunk in iter(lambda: reader.read(1024 * 1024), b""))
+    elif ext == "jl.gz":
+        with gzip.open(path, "rb") as reader:
+            rows = sum(chunk.count(b"\n") for chunk in iter(lambda: reader.read(1024 * 1024), b""))
+    return {"size": path.stat().st_size, "rows": rows, "sha256": digest.hexdigest()}
+
+
+def seal_version(location: str, version: Union[int, None] = None):
+    # sizes, line counts and hashes of a version once all of its files are written
+    if not Path(f"{location}/{MANIFEST}").exists():
+        return
+
+    with locked(location):
+        manifest = read_manifest(location, "")
+        entry = manifest["versions"].get(str(version or manifest["latest"]))
+        if entry is None:
+            return
+
+        for file in entry["files"].values():
+            path = Path(f"{location}/{file['path']}")
+            if path.exists():
+                file.update(describe(path, manifest["ext"]))
+        entry["status"] = "sealed"
+        write_manifest(location, manifest)
+
+
+def resolve_version(
+    root: str,
+    ext: str,
+    date: Union[str, None] = None,
+    version: Union[int, None] = None,
+    prefix: Union[str, None] = None,
+) -> str:
+    location = f"{root}/{date or datetime.now().date().isoformat()}"
+    manifest = read_manifest(location, ext)
+    entry = manifest["versions"].get(str(version or manifest["latest"]))
+    if entry is None or (prefix or "") not in entry["files"]:
+        # not in the manifest, the path the file would have is returned for the error message
+        return f"{location}/{file_name(ext, prefix, version)}"
+    return f"{location}/{entry['files'][prefix or '']['path']}"
+
+
+def run_version(root: str, ext: str, date: Union[str, None], run_id: Union[str, None]) -> Union[int, None]:
+    # the newest version a run wrote under root on that day
+    location = f"{root}/{date or datetime.now().date().isoformat()}"
+    if not run_id or not Path(location).exists():
+        return None
+    versions = read_manifest(location, ext)["versions"]
+    return max((int(number) for number, entry in versions.items() if entry["run_id"] == run_id), default=None)
+
+
+def version_run_id(
+    root: str,
+    ext: str,
+    date: Union[str, None] = None,
+    version: Union[int, None] = None,
+) -> Union[str, None]:
+    location = f"{root}/{date or datetime.now().date().isoformat()}"
+    manifest = read_manifest(location, ext)
+    entry = manifest["versions"].get(str(version or manifest["latest"]))
+    return entry["run_id"] if entry else None
+
+
+def related_version(
+    root: str,
+    ext: str,
+    date: Union[str, None] = None,
+    version: Union[int, None] = None,
+) -> Union[int, None]:
+    # stats and telemetry are numbered on their own, they are found through the run that wrote the data version
+    run_id = version_run_id("data/jsonlines", "jl", date, version)
+    if run_id is None:
+        # written before the manifests, the versions of one run used to share their number
+        return version
+
+    related = run_version(root, ext, date, run_id)
+    if related is None:
+        raise FileNotFoundError(f"No version under {root} was written by run {run_id}")
+    return related
+
+
+def list_versions(root: str, ext: str, date: Union[str, None] = None) -> Dict[str, dict]:
+    location = f"{root}/{date or datetime.now().date().isoformat()}"
+    if not Path(location).exists():
+        return {}
+    return read_manifest(location, ext)["versions"]
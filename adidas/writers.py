@@ -0,0 +1,129 @@
+import gzip
+import json
+import os
+import queue
+import threading
+from typing import Callable, Dict, Iterable, List, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_encoder(name: str) -> Callable[[dict], bytes]:
+    if name == "orjson" and orjson is not None:
+        return lambda record: orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return lambda record: (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+class WriterThread(threading.Thread):
+    def __init__(self, max_tasks: int):
+        super().__init__(daemon=True)
+        # a bounded queue makes the reactor thread wait whenever the disk falls behind
+        self.tasks = queue.Queue(maxsize=max_tasks)
+        self.error = None
+
+    def submit(self, func: Callable, *args):
+        if self.error:
+            raise self.error
+        self.tasks.put((func, args))
+
+    def run(self):
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                self.tasks.task_done()
+                break
+
+            func, args = task
+            try:
+                func(*args)
+            except Exception as error:
+                self.error = error
+            finally:
+                self.tasks.task_done()
+
+    def flush(self):
+        self.tasks.join()
+        if self.error:
+            raise self.error
+
+    def close(self):
+        self.tasks.put(None)
+        self.join()
+        if self.error:
+            raise self.error
+
+
+class JsonLinesWriter:
+    def __init__(
+        self,
+        paths: Dict[str, str],
+        buffer_size: int,
+        queue_size: int,
+        encoder: str = "json",
+        compresslevel: Union[int, None] = None,
+        append: bool = False,
+    ):
+        self.paths = paths
+        self.buffer_size = buffer_size
+        self.encode = json_encoder(encoder)
+        # with a compression level the files are gzipped, the compression runs on the writer thread as well
+        mode = "ab" if append else "wb"
+        if compresslevel is None:
+            self.files = {name: open(path, mode) for name, path in paths.items()}
+        else:
+            self.files = {name: gzip.open(path, mode, compresslevel=compresslevel) for name, path in paths.items()}
+        self.buffers = {name: [] for name in paths}
+        self.buffered = {name: 0 for name in paths}
+        self.thread = WriterThread(queue_size)
+        self.thread.start()
+
+    def write(self, name: str, records: List[dict]):
+        self.write_lines(name, [self.encode(record) for record in records])
+
+    def write_lines(self, name: str, lines: Iterable[bytes]):
+        buffer = self.buffers[name]
+        for line in lines:
+            buffer.append(line)
+            self.buffered[name] += len(line)
+            if self.buffered[name] >= self.buffer_size:
+                self.flush_buffer(name)
+                buffer = self.buffers[name]
+
+    def flush_buffer(self, name: str):
+        if not self.buffers[name]:
+            return
+
+        chunk = b"".join(self.buffers[name])
+        self.buffers[name] = []
+        self.buffered[name] = 0
+        self.thread.submit(self.files[name].write, chunk)
+
+    def flush(self):
+        for name in self.files:
+            self.flush_buffer(name)
+        self.thread.flush()
+
+    def sync(self) -> Dict[str, int]:
+        # everything written so far reaches the disk, the offsets returned mark the end of complete lines
+        self.flush()
+        offsets = {}
+        for name, file in self.files.items():
+            file.flush()
+            if isinstance(file, gzip.GzipFile):
+                file.fileobj.flush()
+                os.fsync(file.fileobj.fileno())
+            else:
+                os.fsync(file.fileno())
+                offsets[name] = file.tell()
+        return offsets
+
+    def close(self):
+        for name in self.files:
+            self.flush_buffer(name)
+        self.thread.close()
+
+        for file in self.files.values():
+            file.close()
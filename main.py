@@ -5,31 +5,85 @@ import zipfile
 from pathlib import Path
 from typing import Union
 
-from typer import Typer
+from typer import BadParameter, Exit, Typer
 
 from adidas.email import send_email
+from adidas.extractors import benchmark_extractors
+from adidas.jobs import run_report_jobs
+from adidas.replay import run_benchmark
 from adidas.reporter import create_dashboard
+from adidas.reprocess import reprocess_archive
+from adidas.reviews import benchmark_review_parsers
+from adidas.shards import run_shards
 from adidas.utils import create_directory
+from adidas.versions import list_versions, seal_version
 
 app = Typer()
 
 
 @app.command(name="run")
-def run_spider(limit: Union[int, None] = None, create_viz: bool = False, mail_on_finish: bool = False):
-    location = create_directory("data/logs", "log")
-    command = "scrapy crawl products"
-    if limit:
-        command = f"{command} -a limit={limit}"
+def run_spider(
+    limit: Union[int, None] = None,
+    fan_out: bool = False,
+    incremental: bool = False,
+    create_viz: bool = False,
+    mail_on_finish: bool = False,
+    record: Union[str, None] = None,
+    workers: int = 1,
+    resume: bool = False,
+):
+    if resume and (incremental or workers > 1):
+        raise BadParameter("--resume continues a single process crawl, leave out --incremental and --workers")
 
+    if workers > 1:
+        if incremental or record:
+            raise BadParameter("--incremental and --record run in a single crawler process, leave out --workers")
+        if not run_sharded(workers, limit, fan_out):
+            raise Exit(code=1)
+        generate_reports(dashboard=create_viz, email=mail_on_finish)
+        return
+
+    location = create_directory("data/logs", "log")
+    command = crawl_command(limit, fan_out, incremental, resume, record)
     try:
         subprocess.run(f"{command} 2>&1 | tee {location}/latest.log", shell=True)
     except Exception:
         subprocess.run(f"{command}", shell=True)
     finally:
-        if mail_on_finish:
-            send_email(subject="Completion of Scraper Task")
-        if create_viz:
-            create_dashboard()
+        seal_version(location)
+        generate_reports(dashboard=create_viz, email=mail_on_finish)
+
+
+def run_sharded(workers: int, limit: Union[int, None], fan_out: bool) -> bool:
+    result = run_shards(workers, limit, fan_out)
+    if result["failed_shards"]:
+        print(f"shards {result['failed_shards']} failed, nothing was merged, see {result['run_directory']}")
+        return False
+
+    for prefix, count in result["records"].items():
+        print(f"{prefix}: {count} records")
+    return True
+
+
+def crawl_command(
+    limit: Union[int, None],
+    fan_out: bool,
+    incremental: bool,
+    resume: bool,
+    record: Union[str, None],
+) -> str:
+    command = "scrapy crawl products"
+    if limit:
+        command = f"{command} -a limit={limit}"
+    if fan_out:
+        command = f"{command} -a fan_out=true"
+    if incremental:
+        command = f"{command} -a incremental=true"
+    if resume:
+        command = f"{command} -a resume=true"
+    if record:
+        command = f"{command} -s RECORD_PATH={record}"
+    return command
 
 
 @app.command(name="clean")
@@ -43,6 +97,7 @@ def clean_slate(backup: bool = False):
                     for root, dirs, files in os.walk("./data"):
                         for file in files:
                             zipf.write(os.path.join(root, file))
+                seal_version(location)
 
             directory_path = Path("./data")
             shutil.rmtree(directory_path)
@@ -60,5 +115,72 @@ def manual_report():
     send_email(subject="Completion of Scraper Task")
 
 
+@app.command(name="bench-extractors")
+def benchmark_product_page_extractors(location: str = "data/pages", rounds: int = 5):
+    for name, result in benchmark_extractors(location, rounds).items():
+        print(
+            f"{name}: {result['pages_per_second']:.1f} pages/s including parsing,",
+            f"{result['extractions_per_second']:.1f} pages/s extraction only",
+        )
+
+
+@app.command(name="bench-reviews")
+def benchmark_review_page_parsers(location: str = "data/reviews", rounds: int = 5):
+    for name, pages_per_second in benchmark_review_parsers(location, rounds).items():
+        print(f"{name}: {pages_per_second:.1f} pages/s")
+
+
+@app.command(name="bench")
+def benchmark_crawl(
+    recording: str = "data/recordings/latest.sqlite",
+    limit: Union[int, None] = None,
+    fan_out: bool = False,
+    latency: float = 0.05,
+    jitter: float = 0.02,
+    distribution: str = "lognormal",
+    keep: bool = False,
+):
+    result = run_benchmark(recording, limit, fan_out, latency, jitter, distribution, keep)
+    print(f"{result['items']} items in {result['seconds']}s: {result['items_per_second']} items/s")
+    print(f"cpu: {result['cpu_ms_per_item']} ms/item, peak memory: {result['peak_memory_mb']} MB")
+    print(f"p99 item latency: {result['p99_item_latency']}s")
+    print(f"responses: {result['responses']}, not in the recording: {result['replay_misses']}")
+    if result["workdir"]:
+        print(f"crawl output kept in {result['workdir']}")
+
+
+@app.command(name="reprocess")
+def reprocess_items(
+    date: Union[str, None] = None,
+    version: Union[int, None] = None,
+    workers: Union[int, None] = None,
+    batch_size: int = 200,
+):
+    summary = reprocess_archive(date=date, version=version, workers=workers, batch_size=batch_size)
+    print(f"{summary.pop('items')} items processed, {summary.pop('failed')} failed")
+    for prefix, count in summary.items():
+        print(f"{prefix}: {count} records")
+
+
+@app.command(name="versions")
+def show_versions(root: str = "data/jsonlines", ext: str = "jl", date: Union[str, None] = None):
+    for version, entry in list_versions(root, ext, date).items():
+        print(f"version {version}: {entry['status']}, run {entry['run_id']}, created at {entry['created_at']}")
+        for file in entry["files"].values():
+            print(f"    {file['path']}: {file.get('rows')} rows, {file.get('size')} bytes, sha256 {file.get('sha256')}")
+
+
+@app.command(name="reports")
+def generate_reports(
+    date: Union[str, None] = None,
+    version: Union[int, None] = None,
+    dashboard: bool = False,
+    email: bool = False,
+):
+    report = run_report_jobs(date=date, version=version, dashboard=dashboard, email=email)
+    for name, job in report.items():
+        print(f"{name}: {job['status']}", f"({job['seconds']}s)" if "seconds" in job else job.get("error", ""))
+
+
 if __name__ == "__main__":
     app()
@@ -0,0 +1,53 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+
+from scrapy.settings import Settings
+
+from adidas.checkpoint import Checkpoint
+from adidas.incremental import IncrementalStore
+from adidas.pipelines import AdidasPipeline
+
+
+class PipelineShutdownTest(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.directory = tempfile.TemporaryDirectory()
+        os.chdir(self.directory.name)
+
+        settings = Settings()
+        settings.setmodule("adidas.settings")
+        settings.set("PARQUET_ENABLED", False)
+        self.spider = SimpleNamespace(
+            checkpoint=Checkpoint("data/checkpoint/state.json", 0),
+            incremental_store=IncrementalStore("data/incremental/state.json"),
+            partial=set(),
+            limit=None,
+            fan_out=False,
+        )
+        self.pipeline = AdidasPipeline(settings)
+        self.pipeline.spider_opened(self.spider)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.directory.cleanup()
+
+    def test_shutdown_saves_the_synced_offsets(self):
+        self.pipeline.writer.write("product-information", [{"product_id": "A0001"}, {"product_id": "A0002"}])
+        self.pipeline.writer.write("product-media", [{"product_id": "A0001"}])
+        self.pipeline.spider_closed(self.spider, "shutdown")
+
+        path = Path("data/checkpoint/state.json")
+        self.assertTrue(path.exists())
+        state = json.loads(path.read_text(encoding="utf-8"))
+        for prefix, file in self.pipeline.writer.paths.items():
+            self.assertEqual(state["offsets"][prefix], os.path.getsize(file))
+        self.assertGreater(state["offsets"]["product-information"], 0)
+        self.assertEqual(state["version"], self.pipeline.version)
+
+
+if __name__ == "__main__":
+    unittest.main()